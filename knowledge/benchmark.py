@@ -0,0 +1,109 @@
+import random
+import sys
+import time
+
+from minesweeper import ArrayMinesweeper, Minesweeper, MinesweeperAI
+
+SIZES = [8, 16, 32, 64, 100]
+ENGINE_SIZES = [8, 16, 32]
+ENGINE_GAMES = 10
+BOARD_SIZES = [100, 200, 400]
+DENSITY = 0.15
+
+
+def main():
+    if len(sys.argv) not in [1, 2]:
+        sys.exit("Usage: python benchmark.py [seed]")
+    seed = int(sys.argv[1]) if len(sys.argv) == 2 else 0
+
+    print("Per-move latency of MinesweeperAI.add_knowledge")
+    print(f"  {'board':>9} {'moves':>6} {'mean ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for size in SIZES:
+        random.seed(seed)
+        latencies, _ = play(size, size, int(size * size * DENSITY))
+        latencies.sort()
+        mean = sum(latencies) / len(latencies)
+        p95 = latencies[int(0.95 * (len(latencies) - 1))]
+        print(
+            f"  {size:>4}x{size:<4} {len(latencies):>6} "
+            f"{mean:>9.3f} {p95:>9.3f} {latencies[-1]:>9.3f}"
+        )
+
+    print("Inference engines over the same games")
+    print(f"  {'board':>9} {'engine':>7} {'guesses':>8} {'mean ms':>9}")
+    for size in ENGINE_SIZES:
+        for inference in ["subset", "linear"]:
+            random.seed(seed)
+            guesses = 0
+            latencies = []
+            for _ in range(ENGINE_GAMES):
+                times, guessed = play(
+                    size, size, int(size * size * DENSITY), inference
+                )
+                latencies.extend(times)
+                guesses += guessed
+            mean = sum(latencies) / len(latencies)
+            print(
+                f"  {size:>4}x{size:<4} {inference:>7} "
+                f"{guesses / ENGINE_GAMES:>8.1f} {mean:>9.3f}"
+            )
+
+    print("Time to build a board and count nearby mines for every cell")
+    print(f"  {'board':>9} {'lists ms':>10} {'arrays ms':>10}")
+
+    # Import NumPy and SciPy before timing anything
+    survey(ArrayMinesweeper, 8, 8, 8)
+    for size in BOARD_SIZES:
+        random.seed(seed)
+        times = [
+            survey(game_class, size, size, int(size * size * DENSITY))
+            for game_class in [Minesweeper, ArrayMinesweeper]
+        ]
+        print(f"  {size:>4}x{size:<4} {times[0]:>10.1f} {times[1]:>10.1f}")
+
+
+def play(height, width, mines, inference="subset"):
+    """
+    Play one game to the end and return the time, in milliseconds,
+    spent in `add_knowledge` for each move, along with the number of
+    moves the AI had to guess.
+
+    When the AI picks a mine, the cell is flagged instead of ending
+    the game, so that every board is explored completely.
+    """
+    game = Minesweeper(height=height, width=width, mines=mines)
+    ai = MinesweeperAI(height=height, width=width, inference=inference)
+    latencies = []
+    guesses = 0
+    while True:
+        move = ai.make_safe_move()
+        if move is None:
+            move = ai.make_random_move()
+            guesses += 1
+        if move is None:
+            break
+        if game.is_mine(move):
+            ai.mark_mine(move)
+            continue
+        nearby = game.nearby_mines(move)
+        start = time.perf_counter()
+        ai.add_knowledge(move, nearby)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, guesses - 1
+
+
+def survey(game_class, height, width, mines):
+    """
+    Return the time, in milliseconds, to create a game of `game_class`
+    and query the number of nearby mines of each cell.
+    """
+    start = time.perf_counter()
+    game = game_class(height=height, width=width, mines=mines)
+    for i in range(height):
+        for j in range(width):
+            game.nearby_mines((i, j))
+    return (time.perf_counter() - start) * 1000
+
+
+if __name__ == "__main__":
+    main()
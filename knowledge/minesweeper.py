@@ -1,6 +1,9 @@
 import itertools
 import random
 
+from collections import deque
+from fractions import Fraction
+
 
 class Minesweeper():
     """
@@ -84,6 +87,109 @@ class Minesweeper():
         return self.mines_found == self.mines
 
 
+class ArrayMinesweeper(Minesweeper):
+    """
+    Minesweeper game representation backed by NumPy arrays,
+    for simulating large boards.
+    """
+
+    def __init__(self, height=8, width=8, mines=8):
+        import numpy as np
+        from scipy import ndimage
+
+        # Set initial width, height, and number of mines
+        self.height = height
+        self.width = width
+
+        # Add mines by sampling distinct flat indices
+        positions = random.sample(range(height * width), mines)
+        self.board = np.zeros((height, width), dtype=bool)
+        self.board.flat[positions] = True
+        self.mines = set(divmod(p, width) for p in positions)
+
+        # Count nearby mines for every cell at once
+        self.counts = neighbour_sum(self.board) - self.board
+
+        # Group cells with no nearby mines into regions that open together
+        zeros = ~self.board & (self.counts == 0)
+        self.labels, _ = ndimage.label(zeros, structure=np.ones((3, 3)))
+        self.regions = ndimage.find_objects(self.labels)
+        self.revealed = np.zeros((height, width), dtype=bool)
+
+        # At first, player has found no mines
+        self.mines_found = set()
+        self.correct_flags = 0
+
+    def is_mine(self, cell):
+        return bool(self.board[cell])
+
+    def nearby_mines(self, cell):
+        """
+        Returns the number of mines that are
+        within one row and column of a given cell,
+        not including the cell itself.
+        """
+        return int(self.counts[cell])
+
+    def reveal(self, cell):
+        """
+        Reveals a safe cell and returns the list of cells newly opened.
+        If the cell has no nearby mines, its whole region of such cells
+        is opened, along with the numbered cells bordering it.
+        """
+        import numpy as np
+
+        label = self.labels[cell]
+        if label == 0:
+            if self.revealed[cell]:
+                return []
+            self.revealed[cell] = True
+            return [cell]
+
+        # Work inside the region's bounding box, grown by one cell
+        rows, cols = self.regions[label - 1]
+        top, left = max(rows.start - 1, 0), max(cols.start - 1, 0)
+        window = (
+            slice(top, min(rows.stop + 1, self.height)),
+            slice(left, min(cols.stop + 1, self.width))
+        )
+        opened = neighbour_sum(self.labels[window] == label) > 0
+        opened &= ~self.revealed[window]
+        self.revealed[window] |= opened
+        return [(top + i, left + j) for i, j in np.argwhere(opened).tolist()]
+
+    def flag(self, cell):
+        """
+        Flags a cell as a mine.
+        """
+        if cell not in self.mines_found:
+            self.mines_found.add(cell)
+            self.correct_flags += self.is_mine(cell)
+
+    def won(self):
+        """
+        Checks if all mines have been flagged.
+        """
+        return (self.correct_flags == len(self.mines)
+                and len(self.mines_found) == len(self.mines))
+
+
+def neighbour_sum(grid):
+    """
+    Returns an array where each cell holds the sum of `grid` over the
+    3x3 window centered on it, treating cells off the board as 0.
+    """
+    import numpy as np
+
+    height, width = grid.shape
+    padded = np.pad(grid.astype(np.int16), 1)
+    total = np.zeros((height, width), dtype=np.int16)
+    for di in range(3):
+        for dj in range(3):
+            total += padded[di:di + height, dj:dj + width]
+    return total
+
+
 class Sentence():
     """
     Logical statement about a Minesweeper game
@@ -135,14 +241,23 @@ class Sentence():
 class MinesweeperAI():
     """
     Minesweeper game player
+
+    `inference` chooses how new knowledge is derived: "subset" compares
+    pairs of sentences, while "linear" also row-reduces all sentences
+    together, which can combine three or more of them.
     """
 
-    def __init__(self, height=8, width=8):
+    def __init__(self, height=8, width=8, inference="subset"):
 
         # Set initial height and width
         self.height = height
         self.width = width
 
+        # Choose the inference engine
+        if inference not in ["subset", "linear"]:
+            raise ValueError(f"Unknown inference engine: {inference}")
+        self.inference = inference
+
         # Keep track of which cells have been clicked on
         self.moves_made = set()
 
@@ -153,14 +268,22 @@ class MinesweeperAI():
         # List of sentences about the game known to be true
         self.knowledge = []
 
+        # Map each cell to the sentences that mention it, keyed by id
+        self.watchers = dict()
+
+        # Sentences that changed and still need to be propagated
+        self.pending = deque()
+        self.queued = set()
+
     def mark_mine(self, cell):
         """
         Marks a cell as a mine, and updates all knowledge
         to mark that cell as a mine as well.
         """
         self.mines.add(cell)
-        for sentence in self.knowledge:
+        for sentence in self.watchers.pop(cell, {}).values():
             sentence.mark_mine(cell)
+            self.enqueue(sentence)
 
     def mark_safe(self, cell):
         """
@@ -168,8 +291,117 @@ class MinesweeperAI():
         to mark that cell as safe as well.
         """
         self.safes.add(cell)
-        for sentence in self.knowledge:
+        for sentence in self.watchers.pop(cell, {}).values():
             sentence.mark_safe(cell)
+            self.enqueue(sentence)
+
+    def enqueue(self, sentence):
+        """
+        Schedules a sentence to be checked again by `propagate`.
+        """
+        if id(sentence) not in self.queued:
+            self.queued.add(id(sentence))
+            self.pending.append(sentence)
+
+    def add_sentence(self, cells, count):
+        """
+        Adds a new sentence to the knowledge base, unless an equal
+        sentence is already known. Returns True if it was added.
+        """
+        if not cells:
+            return False
+        sentence = Sentence(cells, count)
+
+        # Any equal sentence must be watching every one of these cells
+        cell = next(iter(sentence.cells))
+        if sentence in self.watchers.get(cell, {}).values():
+            return False
+
+        self.knowledge.append(sentence)
+        for cell in sentence.cells:
+            self.watchers.setdefault(cell, {})[id(sentence)] = sentence
+        self.enqueue(sentence)
+        return True
+
+    def related(self, sentence):
+        """
+        Returns the other sentences sharing at least one cell with `sentence`.
+        """
+        related = dict()
+        for cell in sentence.cells:
+            related.update(self.watchers.get(cell, {}))
+        related.pop(id(sentence), None)
+        return related.values()
+
+    def propagate(self):
+        """
+        Draws conclusions from every sentence that changed since the
+        last call, until no sentence is left to check.
+
+        Only sentences that share a cell can be a subset of one another,
+        so each changed sentence is compared against its related
+        sentences instead of against the whole knowledge base.
+        """
+        while self.pending:
+            sentence = self.pending.popleft()
+            self.queued.discard(id(sentence))
+            if not sentence.cells:
+                continue
+
+            # Marking cells updates and requeues the sentences watching them
+            if sentence.known_safes():
+                for cell in list(sentence.cells):
+                    self.mark_safe(cell)
+                continue
+            if sentence.known_mines():
+                for cell in list(sentence.cells):
+                    self.mark_mine(cell)
+                continue
+
+            for other in list(self.related(sentence)):
+                if sentence.cells < other.cells:
+                    self.add_sentence(
+                        other.cells - sentence.cells,
+                        other.count - sentence.count
+                    )
+                elif other.cells < sentence.cells:
+                    self.add_sentence(
+                        sentence.cells - other.cells,
+                        sentence.count - other.count
+                    )
+
+    def eliminate(self):
+        """
+        Row-reduces the knowledge base, treating each sentence as a linear
+        equation over its cells, and marks every cell whose value is forced.
+        Returns True if any new cell was marked.
+
+        A reduced row forces its cells when its total equals the smallest
+        or largest sum its coefficients can reach with cells worth 0 or 1.
+        """
+        rows = [
+            (dict.fromkeys(s.cells, Fraction(1)), Fraction(s.count))
+            for s in self.knowledge if s.cells
+        ]
+        safes = set()
+        mines = set()
+        for coefficients, total in row_reduce(rows):
+            low = sum(c for c in coefficients.values() if c < 0)
+            high = sum(c for c in coefficients.values() if c > 0)
+            if total == low:
+                for cell, c in coefficients.items():
+                    (safes if c > 0 else mines).add(cell)
+            elif total == high:
+                for cell, c in coefficients.items():
+                    (mines if c > 0 else safes).add(cell)
+
+        safes -= self.safes
+        mines -= self.mines
+        for cell in safes:
+            self.mark_safe(cell)
+        for cell in mines:
+            self.mark_mine(cell)
+        return bool(safes or mines)
 
     def add_knowledge(self, cell, count):
         """
@@ -200,44 +432,14 @@ class MinesweeperAI():
                     elif (i,j) not in self.safes:
                         neighbors.add((i,j))
 
-        if len(neighbors) > 0:
-            self.knowledge.append(Sentence(neighbors, count))
-
-        while True:
-            x = False
-
-            new_safes = set()
-            new_mines = set()
-            for sentence in self.knowledge:
-                new_safes.update(sentence.known_safes())
-                new_mines.update(sentence.known_mines())
-
-            if new_safes:
-                x = True
-                for s in new_safes:
-                    self.mark_safe(s)
-            if new_mines:
-                x = True
-                for m in new_mines:
-                    self.mark_mine(m)
-
-            self.knowledge = [s for s in self.knowledge if s.cells != set()]
-            for s1 in self.knowledge:
-                for s2 in self.knowledge:
-                    if s1 == s2:
-                        continue
-                    if s1.cells.issubset(s2.cells):
-                        new_cells = s2.cells - s1.cells
-                        new_count = s2.count - s1.count
-                        new_inferred_sentence = Sentence(new_cells, new_count)
-
-                        if new_inferred_sentence not in self.knowledge:
-                            self.knowledge.append(new_inferred_sentence)
-                            x = True
-
-            if not x:
-                break
+        self.add_sentence(neighbors, count)
+        self.propagate()
+        if self.inference == "linear":
+            while self.eliminate():
+                self.propagate()
 
+        # Drop sentences that ran out of cells, once per move
+        self.knowledge = [s for s in self.knowledge if s.cells]
 
     def make_safe_move(self):
         """
@@ -269,3 +471,41 @@ class MinesweeperAI():
         if not possible_moves:
             return None
         return random.choice(possible_moves)
+
+
+def row_reduce(rows):
+    """
+    Returns the nonzero rows of the reduced row echelon form of `rows`.
+    Each row is a pair of a dictionary mapping variables to coefficients,
+    and the row's total.
+    """
+    pivots = dict()
+    for coefficients, total in rows:
+        coefficients = dict(coefficients)
+
+        # Eliminate every variable that already has a pivot row
+        for var in [v for v in coefficients if v in pivots]:
+            factor = coefficients[var]
+            pivot_coefficients, pivot_total = pivots[var]
+            for v, c in pivot_coefficients.items():
+                coefficients[v] = coefficients.get(v, 0) - factor * c
+            total -= factor * pivot_total
+        coefficients = {v: c for v, c in coefficients.items() if c != 0}
+        if not coefficients:
+            continue
+
+        # Normalize on a new pivot and remove it from earlier pivot rows
+        pivot = min(coefficients)
+        factor = coefficients[pivot]
+        coefficients = {v: c / factor for v, c in coefficients.items()}
+        total /= factor
+        for var, (other, other_total) in pivots.items():
+            if pivot in other:
+                scale = other[pivot]
+                for v, c in coefficients.items():
+                    other[v] = other.get(v, 0) - scale * c
+                    if other[v] == 0:
+                        del other[v]
+                pivots[var] = (other, other_total - scale * total)
+        pivots[pivot] = (coefficients, total)
+    return list(pivots.values())
@@ -0,0 +1,190 @@
+import json
+import os
+import sys
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+from crossword import Crossword, load_words
+from generate import BitsetCrosswordCreator
+
+# Seconds to spend on each puzzle before giving up on it
+TIMEOUT = 60
+
+# Pixels per cell of rendered images, lower for smaller, faster images
+CELL_SIZE = 100
+
+# Outcomes of solving a puzzle
+STATUSES = ["solved", "unsatisfiable", "timeout"]
+
+# Word index shared by every puzzle this process solves
+INDEX = None
+
+
+def main():
+
+    # Check for proper usage
+    if len(sys.argv) not in [3, 4]:
+        sys.exit("Usage: python batch.py words (directory|manifest) [output]")
+    words = sys.argv[1]
+    filenames = structure_files(sys.argv[2])
+    output = sys.argv[3] if len(sys.argv) == 4 else None
+
+    # Images are rendered by the workers into an output directory, and
+    # everything else is written here as results arrive
+    images = None
+    if output is not None and not output.endswith((".json", ".jsonl", ".txt")):
+        images = output
+        os.makedirs(images, exist_ok=True)
+        output = None
+
+    # Index the words once here, so that forked workers inherit the index
+    # rather than each loading their own
+    start = time.perf_counter()
+    load_index(words)
+    latencies = []
+    statuses = {status: 0 for status in STATUSES}
+    with open_output(output) as f:
+        if images is None and (output is None or output.endswith(".txt")):
+            write = text_writer(f)
+        else:
+            write = json_writer(f)
+        with ProcessPoolExecutor(
+            initializer=load_index, initargs=(words,)
+        ) as executor:
+            results = executor.map(
+                solve_puzzle, filenames, [images] * len(filenames)
+            )
+            for result in results:
+                write(result)
+                latencies.append(result["seconds"])
+                statuses[result["status"]] += 1
+    elapsed = time.perf_counter() - start
+
+    # Report throughput and latency
+    latencies.sort()
+    print(f"Puzzles: {len(latencies)}", file=sys.stderr)
+    for status, count in statuses.items():
+        print(f"{status.capitalize()}: {count}", file=sys.stderr)
+    print(f"Total time: {elapsed:.3f} s", file=sys.stderr)
+    if latencies:
+        print(
+            f"Throughput: {len(latencies) / elapsed:.1f} puzzles/s",
+            file=sys.stderr
+        )
+        for label, q in [("p50", 0.5), ("p95", 0.95), ("max", 1)]:
+            latency = latencies[int(q * (len(latencies) - 1))]
+            print(f"Latency {label}: {latency * 1000:.2f} ms", file=sys.stderr)
+
+
+def structure_files(source):
+    """
+    Return the structure files listed by `source`, which is either a
+    directory of text files or a manifest with one path per line.
+    Manifest paths are relative to the manifest's own directory.
+    """
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(source, filename)
+            for filename in os.listdir(source)
+            if filename.endswith(".txt")
+        )
+    with open(source) as f:
+        directory = os.path.dirname(source)
+        return [
+            os.path.join(directory, line.strip())
+            for line in f if line.strip()
+        ]
+
+
+def load_index(words):
+    """
+    Load the word index for `words` into this process, unless it was
+    already loaded before the process was forked.
+    """
+    global INDEX
+    if INDEX is None:
+        INDEX = load_words(words)
+
+
+def solve_puzzle(filename, images=None):
+    """
+    Fill in one structure file with the shared word index, saving the
+    result as an image in the directory `images` if one is given.
+
+    The result's status is "solved", "unsatisfiable" if the search
+    finished without a solution, or "timeout" if it ran out of time.
+    """
+    start = time.perf_counter()
+    creator = BitsetCrosswordCreator(Crossword(filename, INDEX))
+    assignment = creator.solve(timeout=TIMEOUT)
+
+    grid = None
+    image = None
+    if assignment is None:
+        status = "timeout" if creator.stopped() else "unsatisfiable"
+    else:
+        status = "solved"
+        crossword = creator.crossword
+        letters = creator.letter_grid(assignment)
+        grid = [
+            "".join(
+                (letters[i][j] or " ") if crossword.structure[i][j] else "█"
+                for j in range(crossword.width)
+            )
+            for i in range(crossword.height)
+        ]
+        if images is not None:
+            name = os.path.splitext(os.path.basename(filename))[0]
+            image = os.path.join(images, name + ".png")
+            creator.save(assignment, image, CELL_SIZE)
+
+    return {
+        "file": filename,
+        "status": status,
+        "grid": grid,
+        "image": image,
+        "nodes": creator.stats["nodes"],
+        "seconds": time.perf_counter() - start
+    }
+
+
+def open_output(output):
+    """
+    Open `output` for writing, or standard output if it is None.
+    """
+    if output is None:
+        return open(sys.stdout.fileno(), "w", closefd=False)
+    return open(output, "w")
+
+
+def json_writer(f):
+    """
+    Return a function writing each result to `f` as a line of JSON.
+    """
+    def write(result):
+        f.write(json.dumps(result, ensure_ascii=False) + "\n")
+        f.flush()
+    return write
+
+
+def text_writer(f):
+    """
+    Return a function writing each result to `f` as its file name
+    followed by the filled-in grid, or why there is none.
+    """
+    def write(result):
+        f.write(result["file"] + "\n")
+        if result["status"] == "timeout":
+            f.write(f"No solution found within {TIMEOUT} seconds.\n")
+        elif result["status"] == "unsatisfiable":
+            f.write("No solution.\n")
+        else:
+            f.write("\n".join(result["grid"]) + "\n")
+        f.write("\n")
+        f.flush()
+    return write
+
+
+if __name__ == "__main__":
+    main()
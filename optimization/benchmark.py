@@ -0,0 +1,654 @@
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from concurrent.futures import ProcessPoolExecutor
+
+import batch
+from crossword import Crossword
+from generate import (
+    BitsetCrosswordCreator, CREATORS, CrosswordCreator, FONT, HEURISTICS,
+    ORDERINGS, PORTFOLIO, PORTFOLIO_TIMEOUT, SEARCHES, portfolio_solve
+)
+
+# Letters repeated roughly in proportion to their frequency in English
+LETTERS = (
+    "EEEEEEEEEEEETTTTTTTTTAAAAAAAAOOOOOOOIIIIIIINNNNNNNSSSSSSHHHHHH"
+    "RRRRRRDDDDLLLLCCCUUUMMMWWFFGGYYPPBVKJXQZ"
+)
+PUZZLES = [(10, 12), (15, 30), (20, 50), (40, 200)]
+VOCABULARIES = [10000, 50000]
+LATTICES = [5, 7, 9]
+LATTICE_WORDS = 20000
+GRIDS = [(10, 15), (20, 60), (30, 150), (40, 300)]
+GRID_WORDS = 10000
+ASSIGNED = [25, 50, 100, 200]
+CANDIDATES = 500
+ORDERING_WORDS = 50000
+PORTFOLIO_RUNS = 8
+BACKJUMP_RUNS = 3
+DICTIONARY_SIZES = [100000, 300000]
+BATCH_PUZZLES = 40
+RENDER_RUNS = 5
+LOW_RESOLUTION = 40
+
+
+def main():
+    if len(sys.argv) not in [2, 3] or sys.argv[1] not in BENCHMARKS:
+        sys.exit(f"Usage: python benchmark.py {'|'.join(BENCHMARKS)} [seed]")
+    seed = int(sys.argv[2]) if len(sys.argv) == 3 else 0
+    BENCHMARKS[sys.argv[1]](seed)
+
+
+def benchmark_solve(seed):
+    """
+    Time `CrosswordCreator.solve` on generated puzzles, separating the
+    initial arc consistency pass from the search.
+    """
+    print("Solving generated puzzles")
+    print(
+        f"  {'words':>6} {'grid':>7} {'slots':>6} "
+        f"{'ac3 s':>8} {'search s':>9} {'solved':>7}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for n in VOCABULARIES:
+            words = write_words(generate_words(n, seed), directory)
+            for size, slots in PUZZLES:
+                structure = write_structure(
+                    generate_structure(size, size, slots, words, seed),
+                    directory
+                )
+                creator = CrosswordCreator(Crossword(structure, words))
+                start = time.perf_counter()
+                creator.enforce_node_consistency()
+                creator.ac3()
+                middle = time.perf_counter()
+                assignment = creator.backtrack(dict())
+                end = time.perf_counter()
+                print(
+                    f"  {n:>6} {size:>3}x{size:<3} "
+                    f"{len(creator.crossword.variables):>6} "
+                    f"{middle - start:>8.3f} {end - middle:>9.3f} "
+                    f"{str(assignment is not None):>7}"
+                )
+
+
+def benchmark_search(seed):
+    """
+    Compare domain representations by how fast backtracking explores
+    lattice puzzles, whose crossing slots force it to backtrack.
+    """
+    print(f"Backtracking search on lattice puzzles ({LATTICE_WORDS} words)")
+    print(
+        f"  {'grid':>5} {'creator':>8} {'nodes':>7} {'seconds':>8} "
+        f"{'nodes/s':>8} {'peak KiB':>9}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        words = write_words(generate_words(LATTICE_WORDS, seed), directory)
+        for size in LATTICES:
+            crossword = Crossword(
+                write_structure(generate_lattice(size), directory), words
+            )
+            for name, creator_class in CREATORS.items():
+                creator = creator_class(crossword)
+                _, elapsed = timed(creator.solve)
+                nodes = creator.stats["nodes"]
+                _, _, peak = profiled(
+                    lambda: creator_class(crossword).solve()
+                )
+                print(
+                    f"  {size:>2}x{size:<2} {name:>8} {nodes:>7} "
+                    f"{elapsed:>8.3f} {nodes / elapsed:>8.1f} {peak:>9.1f}"
+                )
+
+
+def benchmark_scale(seed):
+    """
+    Time building the crossword, the initial arc consistency pass and the
+    search as grids grow to hundreds of slots.
+    """
+    print(f"Scaling with grid size ({GRID_WORDS} words, bitset domains)")
+    print(
+        f"  {'grid':>7} {'slots':>6} {'build s':>8} {'ac3 s':>8} "
+        f"{'search s':>9} {'nodes':>6}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        words = write_words(generate_words(GRID_WORDS, seed), directory)
+        for size, slots in GRIDS:
+            structure = write_structure(
+                generate_structure(size, size, slots, words, seed), directory
+            )
+            crossword, build = timed(Crossword, structure, words)
+            creator = BitsetCrosswordCreator(crossword)
+            _, ac3 = timed(creator.ac3)
+            _, search = timed(creator.backtrack, dict())
+            print(
+                f"  {size:>3}x{size:<3} {len(crossword.variables):>6} "
+                f"{build:>8.3f} {ac3:>8.3f} {search:>9.3f} "
+                f"{creator.stats['nodes']:>6}"
+            )
+
+
+def benchmark_consistency(seed):
+    """
+    Compare checking candidate words with `consistent` on the whole
+    assignment against `fits` on the new variable alone, on partial
+    solutions of the largest generated grid.
+    """
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        words = write_words(generate_words(GRID_WORDS, seed), directory)
+        size, slots = GRIDS[-1]
+        crossword = Crossword(
+            write_structure(
+                generate_structure(size, size, slots, words, seed), directory
+            ),
+            words
+        )
+    creator = BitsetCrosswordCreator(crossword)
+    solution = creator.solve()
+
+    print(f"Checking candidate words on a {size}x{size} grid")
+    print(
+        f"  {'assigned':>8} {'consistent/s':>13} {'fits/s':>10} "
+        f"{'speedup':>8} {'agree':>6}"
+    )
+    for k in ASSIGNED:
+        if k >= len(solution):
+            break
+        *assigned, var = rng.sample(sorted(solution, key=str), k + 1)
+        assignment = {v: solution[v] for v in assigned}
+        creator.used = set(assignment.values())
+        candidates = creator.words[var.length][:CANDIDATES] + [solution[var]]
+        full, full_time = timed(lambda: [
+            creator.consistent({**assignment, var: word})
+            for word in candidates
+        ])
+        incremental, incremental_time = timed(lambda: [
+            creator.fits(var, word, assignment) for word in candidates
+        ])
+        print(
+            f"  {k:>8} {len(candidates) / full_time:>13.0f} "
+            f"{len(candidates) / incremental_time:>10.0f} "
+            f"{full_time / incremental_time:>8.0f} "
+            f"{str(full == incremental):>6}"
+        )
+
+
+def benchmark_ordering(seed):
+    """
+    Compare total solve time with each way of ordering values, on the
+    generated puzzles and the largest lattice.
+    """
+    print(f"Solving with each value ordering ({ORDERING_WORDS} words)")
+    print(
+        f"  {'puzzle':>12} {'creator':>8} {'ordering':>8} "
+        f"{'nodes':>7} {'seconds':>8}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        words = write_words(generate_words(ORDERING_WORDS, seed), directory)
+        puzzles = [
+            (f"{size}x{size}", generate_structure(size, size, slots, words, seed))
+            for size, slots in PUZZLES
+        ]
+        puzzles.append((
+            f"lattice {LATTICES[-1]}", generate_lattice(LATTICES[-1])
+        ))
+        for name, rows in puzzles:
+            crossword = Crossword(write_structure(rows, directory), words)
+            for creator_name, creator_class in CREATORS.items():
+                for ordering in ORDERINGS:
+                    creator = creator_class(crossword, ordering=ordering)
+                    _, elapsed = timed(creator.solve)
+                    print(
+                        f"  {name:>12} {creator_name:>8} {ordering:>8} "
+                        f"{creator.stats['nodes']:>7} {elapsed:>8.3f}"
+                    )
+
+
+def benchmark_portfolio(seed):
+    """
+    Compare one solver with the portfolio of solvers on lattice puzzles
+    over different word lists, where an unlucky early choice can make
+    the single solver backtrack for a long time.
+    """
+    print(
+        f"Portfolio of {len(PORTFOLIO)} solvers against one "
+        f"({os.cpu_count()} CPUs, {LATTICE_WORDS} words)"
+    )
+    print(
+        f"  {'words':>5} {'single s':>9} {'nodes':>7} "
+        f"{'portfolio s':>12} {'winner':>7} {'speedup':>8}"
+    )
+    speedups = []
+    with tempfile.TemporaryDirectory() as directory:
+        structure = write_structure(generate_lattice(LATTICES[-1]), directory)
+        for run in range(PORTFOLIO_RUNS):
+            words = write_words(
+                generate_words(LATTICE_WORDS, seed + run), directory
+            )
+            creator = BitsetCrosswordCreator(
+                Crossword(structure, words), **PORTFOLIO[0]
+            )
+            _, single = timed(creator.solve, PORTFOLIO_TIMEOUT)
+            (_, winner, _), portfolio = timed(portfolio_solve, structure, words)
+            speedups.append(single / portfolio)
+            print(
+                f"  {seed + run:>5} {single:>9.3f} "
+                f"{creator.stats['nodes']:>7} {portfolio:>12.3f} "
+                f"{str(winner):>7} {speedups[-1]:>8.2f}"
+            )
+
+    speedups.sort()
+    print(
+        f"Speedup min {speedups[0]:.2f}, "
+        f"median {speedups[len(speedups) // 2]:.2f}, "
+        f"max {speedups[-1]:.2f}"
+    )
+
+
+def benchmark_backjump(seed):
+    """
+    Count the work done by each search and variable heuristic on one
+    lattice, and on two lattices side by side that share no slots.
+    """
+    print(f"Search effort on lattice puzzles ({LATTICE_WORDS} words)")
+    print(
+        f"  {'puzzle':>7} {'words':>5} {'search':>13} {'heuristic':>9} "
+        f"{'nodes':>6} {'backtracks':>10} {'backjumps':>9} "
+        f"{'nogoods':>7} {'seconds':>8}"
+    )
+    size = LATTICES[-1]
+    with tempfile.TemporaryDirectory() as directory:
+        puzzles = [
+            (f"{size}x{size}", generate_lattice(size)),
+            (f"2 x {size}", generate_lattice(size, 2))
+        ]
+        for run in range(BACKJUMP_RUNS):
+            words = write_words(
+                generate_words(LATTICE_WORDS, seed + run), directory
+            )
+            for name, rows in puzzles:
+                crossword = Crossword(write_structure(rows, directory), words)
+                for search in SEARCHES:
+                    for heuristic in HEURISTICS:
+                        creator = BitsetCrosswordCreator(
+                            crossword, seed=seed, search=search,
+                            heuristic=heuristic
+                        )
+                        _, elapsed = timed(creator.solve, PORTFOLIO_TIMEOUT)
+                        stats = creator.stats
+                        print(
+                            f"  {name:>7} {seed + run:>5} {search:>13} "
+                            f"{heuristic:>9} {stats['nodes']:>6} "
+                            f"{stats['backtracks']:>10} "
+                            f"{stats['backjumps']:>9} "
+                            f"{stats['nogoods']:>7} {elapsed:>8.3f}"
+                        )
+
+
+def benchmark_startup(seed):
+    """
+    Time loading large word lists with and without the word index cache,
+    and creating a solver for a generated puzzle from them.
+    """
+    print("Startup with large word lists")
+    print(
+        f"  {'words':>7} {'step':>22} {'seconds':>8} {'peak KiB':>10}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for n in DICTIONARY_SIZES:
+            words = write_words(generate_words(n, seed), directory)
+            structure = write_structure(
+                generate_structure(15, 15, 30, words, seed), directory
+            )
+            steps = [
+                ("Crossword, no cache", lambda: Crossword(structure, words, False)),
+                ("Crossword, cold cache", lambda: cold(structure, words)),
+                ("Crossword, warm cache", lambda: Crossword(structure, words))
+            ]
+            crossword = Crossword(structure, words)
+            for name, creator_class in CREATORS.items():
+                steps.append((
+                    f"{name} creator",
+                    lambda creator_class=creator_class: creator_class(crossword)
+                ))
+            for step, function in steps:
+                _, elapsed = timed(function)
+                _, _, peak = profiled(function)
+                print(f"  {n:>7} {step:>22} {elapsed:>8.3f} {peak:>10.1f}")
+
+
+def benchmark_batch(seed):
+    """
+    Compare solving a batch of generated puzzles one at a time, each
+    loading the word list itself, with sharing one word index in this
+    process and across a pool of worker processes.
+    """
+    n = DICTIONARY_SIZES[-1]
+    print(
+        f"Batch of {BATCH_PUZZLES} puzzles "
+        f"({os.cpu_count()} CPUs, {n} words)"
+    )
+    print(
+        f"  {'mode':>14} {'seconds':>8} {'puzzles/s':>10} "
+        f"{'p50 ms':>8} {'p95 ms':>8}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        words = write_words(generate_words(n, seed), directory)
+        structures = [
+            write_structure(
+                generate_structure(15, 15, 30, words, seed + k), directory
+            )
+            for k in range(BATCH_PUZZLES)
+        ]
+        Crossword(structures[0], words)
+
+        def separate():
+            latencies = []
+            for structure in structures:
+                _, elapsed = timed(
+                    lambda: BitsetCrosswordCreator(
+                        Crossword(structure, words)
+                    ).solve()
+                )
+                latencies.append(elapsed)
+            return latencies
+
+        def shared():
+            batch.INDEX = None
+            batch.load_index(words)
+            return [
+                batch.solve_puzzle(structure)["seconds"]
+                for structure in structures
+            ]
+
+        def pooled():
+            batch.INDEX = None
+            batch.load_index(words)
+            with ProcessPoolExecutor(
+                initializer=batch.load_index, initargs=(words,)
+            ) as executor:
+                return [
+                    result["seconds"]
+                    for result in executor.map(batch.solve_puzzle, structures)
+                ]
+
+        for mode, function in [
+            ("separate", separate), ("shared index", shared), ("process pool", pooled)
+        ]:
+            latencies, elapsed = timed(function)
+            latencies.sort()
+            print(
+                f"  {mode:>14} {elapsed:>8.3f} "
+                f"{len(latencies) / elapsed:>10.1f} "
+                f"{latencies[len(latencies) // 2] * 1000:>8.1f} "
+                f"{latencies[int(0.95 * (len(latencies) - 1))] * 1000:>8.1f}"
+            )
+
+
+def benchmark_render(seed):
+    """
+    Compare drawing each cell of solved grids with ImageDraw, as `save`
+    used to, against `render` pasting tiles from the glyph atlas, and
+    time encoding each image as PNG.
+    """
+    if not os.path.exists(FONT):
+        sys.exit(f"Rendering needs the font {FONT}")
+    print(f"Rendering solved grids (median of {RENDER_RUNS} runs)")
+    print(
+        f"  {'grid':>7} {'draw ms':>8} {'render ms':>10} {'speedup':>8} "
+        f"{f'{LOW_RESOLUTION}px ms':>8} {'draw png':>9} {'render png':>11}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        words = write_words(generate_words(GRID_WORDS, seed), directory)
+        for size, slots in GRIDS:
+            creator = BitsetCrosswordCreator(Crossword(
+                write_structure(
+                    generate_structure(size, size, slots, words, seed),
+                    directory
+                ),
+                words
+            ))
+            assignment = creator.solve()
+            drawn = draw_cells(creator, assignment)
+            rendered = creator.render(assignment)
+            output = os.path.join(directory, "grid.png")
+            steps = [
+                lambda: draw_cells(creator, assignment),
+                lambda: creator.render(assignment),
+                lambda: creator.render(assignment, LOW_RESOLUTION),
+                lambda: drawn.save(output),
+                lambda: rendered.save(output)
+            ]
+            times = []
+            for function in steps:
+                elapsed = sorted(
+                    timed(function)[1] * 1000 for _ in range(RENDER_RUNS)
+                )
+                times.append(elapsed[len(elapsed) // 2])
+            print(
+                f"  {size:>3}x{size:<3} {times[0]:>8.1f} {times[1]:>10.1f} "
+                f"{times[0] / times[1]:>8.1f} {times[2]:>8.1f} "
+                f"{times[3]:>9.1f} {times[4]:>11.1f}"
+            )
+
+
+def draw_cells(creator, assignment):
+    """
+    Return an image of `assignment` drawn a cell at a time with ImageDraw,
+    loading the font each time, as `save` used to.
+    """
+    from PIL import Image, ImageDraw, ImageFont
+    cell_size = 100
+    cell_border = 2
+    interior_size = cell_size - 2 * cell_border
+    letters = creator.letter_grid(assignment)
+    crossword = creator.crossword
+    img = Image.new(
+        "RGBA",
+        (crossword.width * cell_size, crossword.height * cell_size),
+        "black"
+    )
+    font = ImageFont.truetype(FONT, 80)
+    draw = ImageDraw.Draw(img)
+    for i in range(crossword.height):
+        for j in range(crossword.width):
+            rect = [
+                (j * cell_size + cell_border, i * cell_size + cell_border),
+                ((j + 1) * cell_size - cell_border,
+                 (i + 1) * cell_size - cell_border)
+            ]
+            if crossword.structure[i][j]:
+                draw.rectangle(rect, fill="white")
+                if letters[i][j]:
+                    _, _, w, h = draw.textbbox((0, 0), letters[i][j], font=font)
+                    draw.text(
+                        (rect[0][0] + ((interior_size - w) / 2),
+                         rect[0][1] + ((interior_size - h) / 2) - 10),
+                        letters[i][j], fill="black", font=font
+                    )
+    return img
+
+
+def cold(structure, words):
+    """
+    Load a crossword after deleting the cached index of its word list.
+    """
+    if os.path.exists(words + ".index"):
+        os.remove(words + ".index")
+    return Crossword(structure, words)
+
+
+def generate_words(n, seed, shortest=3, longest=12):
+    """
+    Generate `n` distinct random words of between `shortest` and
+    `longest` letters, drawing letters by their frequency in English.
+    """
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < n:
+        length = rng.randint(shortest, longest)
+        words.add("".join(rng.choice(LETTERS) for _ in range(length)))
+    return sorted(words)
+
+
+def generate_structure(height, width, slots, words_file, seed):
+    """
+    Generate a crossword structure with up to `slots` words that is known
+    to have a solution, by laying words from `words_file` on an empty grid
+    so that each new word crosses the words already placed.
+
+    Return the structure as a list of rows, with "_" for open cells.
+    """
+    rng = random.Random(seed)
+    with open(words_file) as f:
+        words = f.read().splitlines()
+    by_length = dict()
+    for word in words:
+        by_length.setdefault(len(word), []).append(word)
+    grid = [[None for _ in range(width)] for _ in range(height)]
+
+    def filled(i, j):
+        return 0 <= i < height and 0 <= j < width and grid[i][j] is not None
+
+    def crossings(word, i, j, di, dj):
+        """
+        Return how many placed letters `word` would cross if written from
+        (i, j) in direction (di, dj), or 0 if it does not fit there.
+        """
+        end_i, end_j = i + di * (len(word) - 1), j + dj * (len(word) - 1)
+        if i < 0 or j < 0 or end_i >= height or end_j >= width:
+            return 0
+        if filled(i - di, j - dj) or filled(end_i + di, end_j + dj):
+            return 0
+        count = 0
+        for k, letter in enumerate(word):
+            ci, cj = i + di * k, j + dj * k
+            if grid[ci][cj] is None:
+                # Open cells must not touch a parallel word
+                if filled(ci + dj, cj + di) or filled(ci - dj, cj - di):
+                    return 0
+            elif grid[ci][cj] != letter or (k > 0 and filled(ci - di, cj - dj)):
+                return 0
+            else:
+                count += 1
+        return count
+
+    # Start with one word across the middle
+    first = rng.choice([word for word in words if len(word) <= width])
+    for k, letter in enumerate(first):
+        grid[height // 2][(width - len(first)) // 2 + k] = letter
+    cells = [
+        (height // 2, (width - len(first)) // 2 + k)
+        for k in range(len(first))
+    ]
+
+    # Keep crossing letters already on the grid with new words
+    placed = 1
+    for _ in range(200 * slots):
+        if placed == slots:
+            break
+        ci, cj = rng.choice(cells)
+        di, dj = rng.choice([(0, 1), (1, 0)])
+        length = rng.randint(3, min(12, max(height, width)))
+        if length not in by_length:
+            continue
+        k = rng.randrange(length)
+        i, j = ci - di * k, cj - dj * k
+        candidates = rng.sample(by_length[length], min(200, len(by_length[length])))
+        for word in candidates:
+            if word[k] == grid[ci][cj] and crossings(word, i, j, di, dj):
+                for m, letter in enumerate(word):
+                    if grid[i + di * m][j + dj * m] is None:
+                        grid[i + di * m][j + dj * m] = letter
+                        cells.append((i + di * m, j + dj * m))
+                placed += 1
+                break
+
+    return [
+        "".join("#" if letter is None else "_" for letter in row)
+        for row in grid
+    ]
+
+
+def generate_lattice(size, count=1):
+    """
+    Generate a `size` by `size` structure whose even rows and columns are
+    open, so that every across slot crosses every down slot.
+
+    With a `count`, place that many lattices side by side, separated by
+    blocked columns.
+    """
+    return [
+        "#".join(
+            "".join(
+                "_" if i % 2 == 0 or j % 2 == 0 else "#"
+                for j in range(size)
+            )
+            for _ in range(count)
+        )
+        for i in range(size)
+    ]
+
+
+def write_words(words, directory):
+    """
+    Write `words` to a words file in `directory` and return its path.
+    """
+    filename = os.path.join(directory, f"words{len(words)}.txt")
+    with open(filename, "w") as f:
+        f.write("\n".join(words))
+    return filename
+
+
+def write_structure(rows, directory):
+    """
+    Write a structure to a file in `directory` and return its path.
+    """
+    filename = os.path.join(directory, f"structure{len(os.listdir(directory))}.txt")
+    with open(filename, "w") as f:
+        f.write("\n".join(rows))
+    return filename
+
+
+def timed(function, *args):
+    """
+    Return the result of calling `function` and the seconds it took.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def profiled(function, *args):
+    """
+    Return the result of calling `function`, the seconds it took, and the
+    peak memory it allocated in KiB. Timings include tracing overhead.
+    """
+    tracemalloc.start()
+    result, elapsed = timed(function, *args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024
+
+
+BENCHMARKS = {
+    "solve": benchmark_solve,
+    "search": benchmark_search,
+    "scale": benchmark_scale,
+    "consistency": benchmark_consistency,
+    "ordering": benchmark_ordering,
+    "portfolio": benchmark_portfolio,
+    "backjump": benchmark_backjump,
+    "startup": benchmark_startup,
+    "batch": benchmark_batch,
+    "render": benchmark_render
+}
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,17 @@
+import os
+import struct
+
+# Start of a word index cache file, naming the version of its layout
+CACHE_MAGIC = b"CROSSWORD-WORDS 1\n"
+
+
+class Overlaps(dict):
+    """Overlaps of variable pairs, storing only pairs that overlap."""
+
+    def __missing__(self, key):
+        return None
+
+
 class Variable():
 
     ACROSS = "across"
@@ -9,6 +23,7 @@ class Variable():
         self.j = j
         self.direction = direction
         self.length = length
+        self.hash = hash((self.i, self.j, self.direction, self.length))
         self.cells = []
         for k in range(self.length):
             self.cells.append(
@@ -17,7 +32,11 @@ class Variable():
             )
 
     def __hash__(self):
-        return hash((self.i, self.j, self.direction, self.length))
+        return self.hash
+
+    def __reduce__(self):
+        # Rebuild rather than copy the hash, which differs between processes
+        return (Variable, (self.i, self.j, self.direction, self.length))
 
     def __eq__(self, other):
         return (
@@ -35,9 +54,148 @@ class Variable():
         return f"Variable({self.i}, {self.j}, {direction}, {self.length})"
 
 
+class WordIndex():
+    """
+    Distinct words bucketed by length, in sorted order, with a bitset for
+    each position and letter of the words that have that letter there.
+    """
+
+    def __init__(self, words):
+        """Index an iterable of words."""
+        self.words = dict()
+        for word in sorted(set(words)):
+            self.words.setdefault(len(word), []).append(word)
+
+        # masks[length][k][letter] has bit n set if the nth word of
+        # `length` has `letter` at position k
+        self.masks = dict()
+        for length, bucket in self.words.items():
+            self.masks[length] = []
+            for k in range(length):
+                bits = dict()
+                for n, word in enumerate(bucket):
+                    bits.setdefault(word[k], bytearray((len(bucket) + 7) // 8))
+                    bits[word[k]][n // 8] |= 1 << (n % 8)
+                self.masks[length].append({
+                    letter: int.from_bytes(mask, "little")
+                    for letter, mask in bits.items()
+                })
+        self.vocabulary = None
+
+    def word_set(self):
+        """Return the set of all words, built once and then shared."""
+        if self.vocabulary is None:
+            self.vocabulary = set()
+            for bucket in self.words.values():
+                self.vocabulary.update(bucket)
+        return self.vocabulary
+
+    def save(self, filename, source=b""):
+        """
+        Write the index to `filename` in a compact binary layout, tagged
+        with `source` to tell which word list it came from.
+        """
+        # Write a whole new file, so that readers never see half of one
+        temporary = f"{filename}.{os.getpid()}"
+        with open(temporary, "wb") as f:
+            f.write(CACHE_MAGIC)
+            f.write(struct.pack("<I", len(source)) + source)
+            f.write(struct.pack("<I", len(self.words)))
+            for length, bucket in self.words.items():
+                text = "\n".join(bucket).encode()
+                f.write(struct.pack("<III", length, len(bucket), len(text)))
+                f.write(text)
+                size = (len(bucket) + 7) // 8
+                for masks in self.masks[length]:
+                    f.write(struct.pack("<I", len(masks)))
+                    for letter, mask in masks.items():
+                        f.write(struct.pack("<I", ord(letter)))
+                        f.write(mask.to_bytes(size, "little"))
+        os.replace(temporary, filename)
+
+    @classmethod
+    def load(cls, filename, source=b""):
+        """
+        Read an index written by `save` from `source`, or return None if
+        the file is missing, unreadable or from another source.
+        """
+        try:
+            with open(filename, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if not data.startswith(CACHE_MAGIC):
+            return None
+        try:
+            offset = len(CACHE_MAGIC)
+            (size,) = struct.unpack_from("<I", data, offset)
+            offset += 4
+            if data[offset:offset + size] != source:
+                return None
+            offset += size
+
+            index = cls([])
+            (lengths,) = struct.unpack_from("<I", data, offset)
+            offset += 4
+            for _ in range(lengths):
+                length, count, size = struct.unpack_from("<III", data, offset)
+                offset += 12
+                text = data[offset:offset + size].decode()
+                index.words[length] = text.split("\n") if count else []
+                offset += size
+                size = (count + 7) // 8
+                index.masks[length] = []
+                for _ in range(length):
+                    (letters,) = struct.unpack_from("<I", data, offset)
+                    offset += 4
+                    masks = dict()
+                    for _ in range(letters):
+                        (letter,) = struct.unpack_from("<I", data, offset)
+                        offset += 4
+                        masks[chr(letter)] = int.from_bytes(
+                            data[offset:offset + size], "little"
+                        )
+                        offset += size
+                    index.masks[length].append(masks)
+        except (struct.error, UnicodeDecodeError):
+            return None
+        if offset != len(data):
+            return None
+        return index
+
+
+def load_words(words_file, cache=True):
+    """
+    Return a WordIndex of the upper-cased words in `words_file`.
+
+    With `cache`, the index is kept in a file beside the word list and
+    reused until the word list's size or modification time changes.
+    """
+    cache_file = words_file + ".index"
+    status = os.stat(words_file)
+    source = f"{status.st_size} {status.st_mtime_ns}".encode()
+    if cache:
+        index = WordIndex.load(cache_file, source)
+        if index is not None:
+            return index
+
+    with open(words_file) as f:
+        index = WordIndex(f.read().upper().splitlines())
+    if cache:
+        try:
+            index.save(cache_file, source)
+        except OSError:
+            pass
+    return index
+
+
 class Crossword():
 
-    def __init__(self, structure_file, words_file):
+    def __init__(self, structure_file, words_file, cache=True):
+        """
+        Load a crossword structure and its vocabulary. `words_file` may
+        also be a WordIndex already loaded, to share it between puzzles.
+        """
 
         # Determine structure of crossword
         with open(structure_file) as f:
@@ -57,9 +215,12 @@ class Crossword():
                         row.append(False)
                 self.structure.append(row)
 
-        # Save vocabulary list
-        with open(words_file) as f:
-            self.words = set(f.read().upper().splitlines())
+        # Save vocabulary list, bucketed by length and indexed by letter
+        if isinstance(words_file, WordIndex):
+            self.index = words_file
+        else:
+            self.index = load_words(words_file, cache)
+        self.words = self.index.word_set()
 
         # Determine variable set
         self.variables = set()
@@ -108,26 +269,24 @@ class Crossword():
         # For any pair of variables v1, v2, their overlap is either:
         #    None, if the two variables do not overlap; or
         #    (i, j), where v1's ith character overlaps v2's jth character
-        self.overlaps = dict()
-        for v1 in self.variables:
-            for v2 in self.variables:
-                if v1 == v2:
-                    continue
-                cells1 = v1.cells
-                cells2 = v2.cells
-                intersection = set(cells1).intersection(cells2)
-                if not intersection:
-                    self.overlaps[v1, v2] = None
-                else:
-                    intersection = intersection.pop()
-                    self.overlaps[v1, v2] = (
-                        cells1.index(intersection),
-                        cells2.index(intersection)
-                    )
+        # Only overlapping pairs are stored, found through the variables
+        # covering each cell
+        covering = dict()
+        for v in self.variables:
+            for k, cell in enumerate(v.cells):
+                covering.setdefault(cell, []).append((v, k))
+        self.overlaps = Overlaps()
+        for pairs in covering.values():
+            for v1, k1 in pairs:
+                for v2, k2 in pairs:
+                    if v1 != v2:
+                        self.overlaps[v1, v2] = (k1, k2)
+
+        # Map each variable to its neighbors and their overlaps
+        self.adjacency = {v: dict() for v in self.variables}
+        for (v1, v2), overlap in self.overlaps.items():
+            self.adjacency[v1][v2] = overlap
 
     def neighbors(self, var):
         """Given a variable, return set of overlapping variables."""
-        return set(
-            v for v in self.variables
-            if v != var and self.overlaps[v, var]
-        )
+        return set(self.adjacency[var])
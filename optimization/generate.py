@@ -1,17 +1,135 @@
+import random
 import sys
+import time
+
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import Event
 
 from crossword import *
 
+# Ways to order the values of a variable: least constraining value first,
+# least constraining among a sample of large domains, or domain order
+ORDERINGS = ["lcv", "sample", "none"]
+
+# Number of values scored when sampling a large domain
+LCV_SAMPLE = 100
+
+# Ways to search: chronological backtracking, or conflict-directed
+# backjumping with learned nogoods
+SEARCHES = ["chronological", "backjumping"]
+
+# Ways to choose the next variable: fewest remaining values, or fewest
+# remaining values per weighted degree (dom/wdeg)
+HEURISTICS = ["mrv", "domwdeg"]
+
+# Largest number of assignments kept in a learned nogood
+NOGOOD_SIZE = 4
+
+# Assignments allowed before the first restart, scaled by the Luby sequence
+RESTART_NODES = 50
+
+# Solver configurations tried at once in portfolio mode
+PORTFOLIO = [
+    {"ordering": "lcv"},
+    {"ordering": "lcv", "seed": 1},
+    {"ordering": "lcv", "seed": 2, "restarts": True},
+    {"ordering": "sample", "seed": 3, "restarts": True}
+]
+PORTFOLIO_TIMEOUT = 60
+
+# Event telling portfolio workers in this process to give up
+STOP = None
+
+# Font for saved images, with the fonts and letter tile atlases already
+# made from it by this process
+FONT = "assets/fonts/OpenSans-Regular.ttf"
+FONTS = dict()
+ATLASES = dict()
+
+# Smallest cell, in pixels, that saved images can draw a letter in
+MIN_CELL_SIZE = 10
+
 
 class CrosswordCreator():
 
-    def __init__(self, crossword):
+    def __init__(self, crossword, ordering="lcv", seed=None, restarts=False,
+                 search="chronological", heuristic="mrv"):
         """
         Create new CSP crossword generate.
+
+        With a `seed`, ties between variables and between values are
+        broken at random. With `restarts`, the search starts over after a
+        growing number of assignments, which only helps with a seed.
         """
         self.crossword = crossword
-        self.domains = {
-            var: self.crossword.words.copy()
+        self.domains = self.full_domains()
+
+        # Choose how to order values and variables, and how to search
+        if ordering not in ORDERINGS:
+            raise ValueError(f"Unknown ordering: {ordering}")
+        if search not in SEARCHES:
+            raise ValueError(f"Unknown search: {search}")
+        if heuristic not in HEURISTICS:
+            raise ValueError(f"Unknown heuristic: {heuristic}")
+        self.ordering = ordering
+        self.search = search
+        self.heuristic = heuristic
+        self.random = random.Random(seed)
+        self.shuffle = seed is not None
+        self.restarts = restarts
+
+        # When the search should give up: a number of assignments, a
+        # time.monotonic() deadline, or an event being set
+        self.limit = None
+        self.deadline = None
+        self.stop = None
+
+        # For each variable, how many words in its domain have each letter
+        # at each position, built the first time `revise` needs it
+        self.letters = dict()
+
+        # Changes to the domains, in order, so that backtracking can undo
+        # them
+        self.trail = []
+
+        # Words in the search's current assignment
+        self.used = set()
+
+        # How often revising each arc has emptied a domain, and the
+        # variable whose domain was emptied last
+        self.weights = dict()
+        self.conflict = None
+
+        # While backjumping, the assigned variables that removed words
+        # from each domain, with each addition in order so that
+        # backtracking can undo it, and the current assignment
+        self.reasons = None
+        self.explained = []
+        self.assigned = None
+
+        # Learned sets of assignments that cannot all hold, indexed by
+        # each of their assignments
+        self.nogoods = dict()
+
+        # Search counts: assignments tried, variables whose values ran
+        # out, returns that skipped over variables, restarts and nogoods
+        self.stats = {
+            "nodes": 0,
+            "backtracks": 0,
+            "backjumps": 0,
+            "restarts": 0,
+            "nogoods": 0
+        }
+
+    def full_domains(self):
+        """
+        Return the domain of every variable before any inference, which
+        holds only the words of its length.
+        """
+        return {
+            var: set(self.crossword.index.words.get(var.length, []))
             for var in self.crossword.variables
         }
 
@@ -44,54 +162,98 @@ class CrosswordCreator():
                     print("█", end="")
             print()
 
-    def save(self, assignment, filename):
+    def save(self, assignment, filename, cell_size=100):
         """
-        Save crossword assignment to an image file.
+        Save crossword assignment to an image file, drawing each cell
+        `cell_size` pixels square.
         """
-        from PIL import Image, ImageDraw, ImageFont
-        cell_size = 100
-        cell_border = 2
-        interior_size = cell_size - 2 * cell_border
-        letters = self.letter_grid(assignment)
+        self.render(assignment, cell_size).save(filename)
 
-        # Create a blank canvas
-        img = Image.new(
-            "RGBA",
-            (self.crossword.width * cell_size,
-             self.crossword.height * cell_size),
-            "black"
-        )
-        font = ImageFont.truetype("assets/fonts/OpenSans-Regular.ttf", 80)
-        draw = ImageDraw.Draw(img)
-
-        for i in range(self.crossword.height):
-            for j in range(self.crossword.width):
+    def render(self, assignment, cell_size=100):
+        """
+        Return an image of a crossword assignment, drawing each cell
+        `cell_size` pixels square.
+        """
+        import numpy as np
+        from PIL import Image
+        if cell_size < MIN_CELL_SIZE:
+            raise ValueError(
+                f"Cell size must be at least {MIN_CELL_SIZE} pixels: {cell_size}"
+            )
+        cell_border = max(1, cell_size // 50)
+        interior_size = cell_size - 2 * cell_border
+        height, width = self.crossword.height, self.crossword.width
 
-                rect = [
-                    (j * cell_size + cell_border,
-                     i * cell_size + cell_border),
-                    ((j + 1) * cell_size - cell_border,
-                     (i + 1) * cell_size - cell_border)
-                ]
-                if self.crossword.structure[i][j]:
-                    draw.rectangle(rect, fill="white")
-                    if letters[i][j]:
-                        _, _, w, h = draw.textbbox((0, 0), letters[i][j], font=font)
-                        draw.text(
-                            (rect[0][0] + ((interior_size - w) / 2),
-                             rect[0][1] + ((interior_size - h) / 2) - 10),
-                            letters[i][j], fill="black", font=font
-                        )
+        # Make every open cell white inside its border, on a black canvas
+        # with one byte per pixel, since the image has no colour
+        structure = np.array(self.crossword.structure, dtype=np.uint8)
+        interior = np.zeros(cell_size, dtype=np.uint8)
+        interior[cell_border:cell_size - cell_border + 1] = 1
+        cell = interior[:, None] * interior[None, :] * np.uint8(255)
+        canvas = structure[:, None, :, None] * cell[None, :, None, :]
 
-        img.save(filename)
+        # Copy the tile of every letter into its cell at once
+        letters = self.letter_grid(assignment)
+        filled = [
+            (i, j, letters[i][j])
+            for i in range(height)
+            for j in range(width)
+            if self.crossword.structure[i][j] and letters[i][j]
+        ]
+        if filled:
+            rows, columns, chosen = zip(*filled)
+            positions, atlas = glyph_atlas(
+                chosen, interior_size, cell_size * 4 // 5, cell_size // 10
+            )
+            cells = canvas.transpose(0, 2, 1, 3)
+            tile = slice(cell_border, cell_border + interior_size + 1)
+            cells[list(rows), list(columns), tile, tile] = atlas[
+                [positions[letter] for letter in chosen]
+            ]
+
+        return Image.fromarray(
+            canvas.reshape(height * cell_size, width * cell_size), "L"
+        )
 
-    def solve(self):
+    def solve(self, timeout=None, stop=None):
         """
         Enforce node and arc consistency, and then solve the CSP.
+
+        Give up and return None after `timeout` seconds, or once the
+        event `stop` is set.
         """
+        if timeout is not None:
+            self.deadline = time.monotonic() + timeout
+        self.stop = stop
         self.enforce_node_consistency()
         self.ac3()
-        return self.backtrack(dict())
+        search = self.backtrack if self.search == "chronological" else self.backjump
+        if not self.restarts:
+            return search(dict())
+
+        # Search with a growing limit on assignments, starting over from
+        # the consistent domains each time the limit is reached
+        mark = len(self.trail)
+        k = 1
+        while True:
+            self.limit = self.stats["nodes"] + RESTART_NODES * luby(k)
+            assignment = search(dict())
+            if assignment is not None or self.stats["nodes"] < self.limit:
+                return assignment
+            self.restore(mark)
+            self.stats["restarts"] += 1
+            k += 1
+
+    def stopped(self):
+        """
+        Return True if the search has reached its limit on assignments,
+        passed its deadline or been told to stop.
+        """
+        return (
+            (self.limit is not None and self.stats["nodes"] >= self.limit)
+            or (self.deadline is not None and time.monotonic() > self.deadline)
+            or (self.stop is not None and self.stop.is_set())
+        )
 
     def enforce_node_consistency(self):
         """
@@ -101,6 +263,81 @@ class CrosswordCreator():
         """
         for v in self.domains:
             self.domains[v] = {word for word in self.domains[v] if len(word) == v.length}
+        self.letters.clear()
+
+    def letter_counts(self, var):
+        """
+        Return a list with one dict for each position of `var`, mapping each
+        letter to the number of words in `self.domains[var]` that have that
+        letter at that position.
+        """
+        if var not in self.letters:
+            counts = [dict() for _ in range(var.length)]
+            for word in self.domains[var]:
+                for position, letter in zip(counts, word):
+                    position[letter] = position.get(letter, 0) + 1
+            self.letters[var] = counts
+        return self.letters[var]
+
+    def remove_words(self, var, words):
+        """
+        Remove `words` from the domain of `var`, keeping its letter counts
+        up to date and recording the removal on the trail.
+        """
+        self.domains[var].difference_update(words)
+        self.trail.append((var, words))
+
+        # Counting the rest of the domain again later is cheaper than
+        # updating the counts for most of it now
+        if len(words) > len(self.domains[var]):
+            self.letters.pop(var, None)
+        elif var in self.letters:
+            for word in words:
+                for position, letter in zip(self.letters[var], word):
+                    position[letter] -= 1
+                    if position[letter] == 0:
+                        del position[letter]
+
+    def choose(self, var, value):
+        """
+        Reduce the domain of `var` to `value`, recording the change on the
+        trail.
+        """
+        self.remove_words(var, [word for word in self.domains[var] if word != value])
+
+    def restore(self, mark):
+        """
+        Undo every change to the domains made since the trail had length
+        `mark`.
+        """
+        while len(self.trail) > mark:
+            var, words = self.trail.pop()
+            self.domains[var].update(words)
+            if 2 * len(words) > len(self.domains[var]):
+                self.letters.pop(var, None)
+            elif var in self.letters:
+                for word in words:
+                    for position, letter in zip(self.letters[var], word):
+                        position[letter] = position.get(letter, 0) + 1
+
+    def domain_size(self, var):
+        """
+        Return the number of words left in the domain of `var`.
+        """
+        return len(self.domains[var])
+
+    def domain_words(self, var):
+        """
+        Return the words left in the domain of `var`.
+        """
+        return self.domains[var]
+
+    def letter_histogram(self, var, position):
+        """
+        Return a dict mapping each letter to the number of words in the
+        domain of `var` with that letter at `position`.
+        """
+        return self.letter_counts(var)[position]
 
     def revise(self, x, y):
         """
@@ -111,28 +348,19 @@ class CrosswordCreator():
         Return True if a revision was made to the domain of `x`; return
         False if no revision was made.
         """
-        # following the pseudocode
-        revised = False
         overlap = self.crossword.overlaps[x, y]
         if overlap is None:
             return False
         i, j = overlap
-        to_remove = []
-
-        for X in self.domains[x]:
-            match_found = False
-            for Y in self.domains[y]:
-                if X[i] == Y[j]:
-                    match_found = True
-                    break
 
-            if not match_found:
-                to_remove.append(X)
-                revised = True
-        for word in to_remove:
-            self.domains[x].remove(word)
-
-        return revised
+        # A word for x is supported if some word for y has its letter at
+        # the overlap, which is a lookup in y's letter counts
+        supported = self.letter_counts(y)[j]
+        to_remove = [X for X in self.domains[x] if X[i] not in supported]
+        if not to_remove:
+            return False
+        self.remove_words(x, to_remove)
+        return True
 
     def ac3(self, arcs=None):
         """
@@ -143,26 +371,32 @@ class CrosswordCreator():
         Return True if arc consistency is enforced and no domains are empty;
         return False if one or more domains end up empty.
         """
-        # create queue
+        # create queue, remembering which arcs are in it
         if arcs == None:
-            queue = []
-            for v1 in self.crossword.variables:
-                for v2 in self.crossword.variables:
-                    if v1 != v2:
-                        overlap = self.crossword.overlaps[v1, v2]
-                        if overlap is not None:
-                            queue.append((v1, v2))
+            queue = deque(
+                (v1, v2)
+                for v1 in self.crossword.variables
+                for v2 in self.crossword.adjacency[v1]
+            )
         else:
-            queue = list(arcs)
+            queue = deque(dict.fromkeys(arcs))
+        queued = set(queue)
 
-        while len(queue) != 0:
-            (x, y) = queue.pop(0)  # first element
+        while queue:
+            (x, y) = queue.popleft()  # first element
+            queued.remove((x, y))
             if self.revise(x, y):
-                if len(self.domains[x]) == 0:
+                if self.reasons is not None:
+                    self.explain(x, y)
+                if not self.domains[x]:
+                    self.weights[x, y] = self.weights.get((x, y), 0) + 1
+                    self.weights[y, x] = self.weights.get((y, x), 0) + 1
+                    self.conflict = x
                     return False
-                for z in self.crossword.neighbors(x):
-                    if z != y:
+                for z in self.crossword.adjacency[x]:
+                    if z != y and (z, x) not in queued:
                         queue.append((z, x))
+                        queued.add((z, x))
         return True
 
     def assignment_complete(self, assignment):
@@ -202,6 +436,19 @@ class CrosswordCreator():
                             return False
         return True
 
+    def fits(self, var, value, assignment):
+        """
+        Return True if adding `var` = `value` to the consistent `assignment`
+        keeps it consistent, checking only the constraints on `var`.
+        The words of `assignment` must be in `self.used`.
+        """
+        if value in self.used or len(value) != var.length:
+            return False
+        for neighbor, (i, j) in self.crossword.adjacency[var].items():
+            if neighbor in assignment and assignment[neighbor][j] != value[i]:
+                return False
+        return True
+
     def order_domain_values(self, var, assignment):
         """
         Return a list of values in the domain of `var`, in order by
@@ -209,24 +456,30 @@ class CrosswordCreator():
         The first value in the list, for example, should be the one
         that rules out the fewest values among the neighbors of `var`.
         """
-        # least constraining value heuristic
-        neighbors = self.crossword.neighbors(var)
-        unassigned_neighbors = [n for n in neighbors if n not in assignment]
-
-        counts = {}
-
-        for value in self.domains[var]:
-            ruled_out = 0
-            for neighbor in unassigned_neighbors:
-                overlap = self.crossword.overlaps[var, neighbor]
-                i, j = overlap
-
-                for neighbor_value in self.domains[neighbor]:
-                    if value[i] != neighbor_value[j]:
-                        ruled_out += 1
-
-            counts[value] = ruled_out
-        return sorted(self.domains[var], key=lambda val: counts[val])
+        values = list(self.domain_words(var))
+        if self.shuffle:
+            self.random.shuffle(values)
+        if self.ordering == "none":
+            return values
+
+        # When sampling, order only a sample of a large domain, and try
+        # the other values after it
+        rest = []
+        if self.ordering == "sample" and len(values) > LCV_SAMPLE:
+            self.random.shuffle(values)
+            values, rest = values[:LCV_SAMPLE], values[LCV_SAMPLE:]
+
+        # least constraining value heuristic: a value rules out the words
+        # of each unassigned neighbor without its letter at the overlap
+        counts = {value: 0 for value in values}
+        for neighbor, (i, j) in self.crossword.adjacency[var].items():
+            if neighbor in assignment:
+                continue
+            histogram = self.letter_histogram(neighbor, j)
+            size = self.domain_size(neighbor)
+            for value in values:
+                counts[value] += size - histogram.get(value[i], 0)
+        return sorted(values, key=lambda val: counts[val]) + rest
 
     def select_unassigned_variable(self, assignment):
         """
@@ -237,12 +490,19 @@ class CrosswordCreator():
         return values.
         """
         unassigned_vars = [v for v in self.crossword.variables if v not in assignment]
+        if self.shuffle:
+            self.random.shuffle(unassigned_vars)
+        if self.heuristic == "domwdeg":
+            return min(
+                unassigned_vars,
+                key=lambda v: self.domain_size(v) / self.weighted_degree(v, assignment)
+            )
         best_v = None
         min_remaining_vals = float("inf")  # can only go down
         max_degree = -1  # can only go up
         for v in unassigned_vars:
-            num_vals = len(self.domains[v])
-            degree = len(self.crossword.neighbors(v))
+            num_vals = self.domain_size(v)
+            degree = len(self.crossword.adjacency[v])
             if num_vals < min_remaining_vals:
                 min_remaining_vals = num_vals
                 max_degree = degree
@@ -260,46 +520,450 @@ class CrosswordCreator():
 
         `assignment` is a mapping from variables (keys) to words (values).
 
-        If no assignment is possible, return None.
+        If no assignment is possible, or the search is stopped, return None.
         """
         if self.assignment_complete(assignment):
             return assignment
+        if self.stopped():
+            return None
+        if len(self.used) != len(assignment):
+            self.used = set(assignment.values())
         var = self.select_unassigned_variable(assignment)
         for value in self.order_domain_values(var, assignment):
-            if self.consistent({**assignment, var: value}):
+            if self.fits(var, value, assignment):
                 assignment[var] = value
-                # keep a copy to restore later
-                old_domains = {v: self.domains[v].copy() for v in self.domains}
-                self.domains[var] = {value}
-                if self.ac3(arcs=[(z, var) for z in self.crossword.neighbors(var)]):
+                self.used.add(value)
+                self.stats["nodes"] += 1
+                # remember where the trail ends to restore later
+                mark = len(self.trail)
+                self.choose(var, value)
+                if self.ac3(arcs=[(z, var) for z in self.crossword.adjacency[var]]):
                     result = self.backtrack(assignment)  # recursively go thorugh the function
                     if result is not None:
                         return result
 
                 # if inference failed
-                self.domains = old_domains
+                self.restore(mark)
+                self.used.remove(value)
                 del assignment[var]
+                if self.stopped():
+                    return None
+        self.stats["backtracks"] += 1
         return None
 
+    def weighted_degree(self, var, assignment):
+        """
+        Return the number of unassigned neighbors of `var`, counting each
+        once more for every time their overlap emptied a domain.
+        """
+        return sum(
+            1 + self.weights.get((var, neighbor), 0)
+            for neighbor in self.crossword.adjacency[var]
+            if neighbor not in assignment
+        ) or 0.5
+
+    def backjump(self, assignment):
+        """
+        Using conflict-directed backjumping, take as input a partial
+        assignment for the crossword and return a complete assignment if
+        possible to do so.
+
+        When every value of a variable fails, the search returns straight
+        to the latest assignment involved in the failures, and remembers
+        the assignments involved as a nogood.
+
+        If no assignment is possible, or the search is stopped, return None.
+        """
+        # Words removed before the search are blamed on every assignment
+        self.reasons = {
+            var: set(assignment) for var in self.crossword.variables
+        }
+        self.explained = []
+        self.assigned = assignment
+        if len(self.used) != len(assignment):
+            self.used = set(assignment.values())
+        result, _ = self.jump(assignment)
+        self.reasons = None
+        return result
+
+    def jump(self, assignment):
+        """
+        Extend `assignment` by conflict-directed backjumping.
+
+        Return the complete assignment and None, or None and the set of
+        assigned variables responsible for the failure.
+        """
+        if self.assignment_complete(assignment):
+            return assignment, None
+        if self.stopped():
+            return None, set()
+        var = self.select_unassigned_variable(assignment)
+
+        # The values already gone were removed by these assignments
+        conflicts = set(self.reasons[var])
+        for value in self.order_domain_values(var, assignment):
+            culprits = self.culprits(var, value, assignment)
+            if culprits is not None:
+                conflicts |= culprits
+                continue
+            assignment[var] = value
+            self.used.add(value)
+            self.stats["nodes"] += 1
+            mark = len(self.trail)
+            explained = len(self.explained)
+            self.choose(var, value)
+            if self.ac3(arcs=[(z, var) for z in self.crossword.adjacency[var]]):
+                result, failed = self.jump(assignment)
+                if result is not None:
+                    return result, None
+            else:
+                failed = self.reasons[self.conflict] | {var}
+
+            # Undo the assignment and its inferences
+            self.restore(mark)
+            self.forget(explained)
+            self.used.remove(value)
+            del assignment[var]
+            if self.stopped():
+                return None, set()
+
+            # If this variable played no part, no other value can help
+            if var not in failed:
+                self.stats["backjumps"] += 1
+                return None, failed
+            conflicts |= failed - {var}
+
+        self.stats["backtracks"] += 1
+        self.learn(conflicts, assignment)
+        return None, conflicts
+
+    def culprits(self, var, value, assignment):
+        """
+        Return None if `var` = `value` fits `assignment` and breaks no
+        learned nogood. Otherwise return the assigned variables that rule
+        it out.
+        """
+        if not self.fits(var, value, assignment):
+            for neighbor, (i, j) in self.crossword.adjacency[var].items():
+                if neighbor in assignment and assignment[neighbor][j] != value[i]:
+                    return {neighbor}
+            return {v for v in assignment if assignment[v] == value}
+        for nogood in self.nogoods.get((var, value), []):
+            if all(assignment.get(v) == word for v, word in nogood if v != var):
+                return {v for v, _ in nogood if v != var}
+        return None
+
+    def explain(self, x, y):
+        """
+        Blame the words just removed from the domain of `x` by revising it
+        against `y` on the assignments that shaped the domain of `y`.
+        """
+        causes = self.reasons[y]
+        if y in self.assigned:
+            causes = causes | {y}
+        for cause in causes - self.reasons[x]:
+            self.reasons[x].add(cause)
+            self.explained.append((x, cause))
+
+    def forget(self, mark):
+        """
+        Undo the blame recorded since `self.explained` had length `mark`.
+        """
+        while len(self.explained) > mark:
+            var, cause = self.explained.pop()
+            self.reasons[var].discard(cause)
+
+    def learn(self, conflicts, assignment):
+        """
+        Remember that the assignments to `conflicts` cannot all hold, if
+        there are few enough of them to be worth checking.
+        """
+        if not conflicts or len(conflicts) > NOGOOD_SIZE:
+            return
+        nogood = frozenset((v, assignment[v]) for v in conflicts)
+        for pair in nogood:
+            self.nogoods.setdefault(pair, []).append(nogood)
+        self.stats["nogoods"] += 1
+
+
+class BitsetCrosswordCreator(CrosswordCreator):
+    """
+    Crossword generator whose domains are integers, with bit k set when
+    the kth word of the variable's length is still possible.
+    """
+
+    def __init__(self, crossword, **options):
+        """
+        Create new CSP crossword generate, whose bits number the words of
+        each length in the crossword's word index.
+        """
+        # Words of each length, in the order of their bits, and masks
+        # where masks[length][k][letter] has the bits of the words of
+        # `length` with `letter` at position k, shared with the crossword
+        self.words = dict(crossword.index.words)
+        self.masks = dict(crossword.index.masks)
+        for var in crossword.variables:
+            if var.length not in self.words:
+                self.words[var.length] = []
+                self.masks[var.length] = [dict() for _ in range(var.length)]
+
+        super().__init__(crossword, **options)
+
+    def full_domains(self):
+        """
+        Return the domain of every variable before any inference, which
+        is every word of its length.
+        """
+        return {
+            var: (1 << len(self.words.get(var.length, []))) - 1
+            for var in self.crossword.variables
+        }
+
+    def enforce_node_consistency(self):
+        """
+        Give each variable every word of its length.
+        """
+        self.domains = self.full_domains()
+
+    def revise(self, x, y):
+        """
+        Make variable `x` arc consistent with variable `y`.
+
+        Return True if a revision was made to the domain of `x`; return
+        False if no revision was made.
+        """
+        overlap = self.crossword.overlaps[x, y]
+        if overlap is None:
+            return False
+        i, j = overlap
+
+        # Letters y can still place at the overlap, as words of x
+        allowed = 0
+        for letter, mask in self.masks[y.length][j].items():
+            if self.domains[y] & mask:
+                allowed |= self.masks[x.length][i].get(letter, 0)
+        domain = self.domains[x] & allowed
+        if domain == self.domains[x]:
+            return False
+        self.trail.append((x, self.domains[x]))
+        self.domains[x] = domain
+        return True
+
+    def choose(self, var, value):
+        """
+        Reduce the domain of `var` to `value`, recording the change on the
+        trail.
+        """
+        self.trail.append((var, self.domains[var]))
+        self.domains[var] = 1 << bisect_left(self.words[var.length], value)
+
+    def restore(self, mark):
+        """
+        Undo every change to the domains made since the trail had length
+        `mark`.
+        """
+        while len(self.trail) > mark:
+            var, domain = self.trail.pop()
+            self.domains[var] = domain
+
+    def domain_size(self, var):
+        """
+        Return the number of words left in the domain of `var`.
+        """
+        return self.domains[var].bit_count()
+
+    def domain_words(self, var):
+        """
+        Return the words left in the domain of `var`.
+        """
+        words = self.words.get(var.length, [])
+        bits = bin(self.domains[var])[:1:-1]
+        return [words[k] for k, bit in enumerate(bits) if bit == "1"]
+
+    def letter_histogram(self, var, position):
+        """
+        Return a dict mapping each letter to the number of words in the
+        domain of `var` with that letter at `position`.
+        """
+        return {
+            letter: (self.domains[var] & mask).bit_count()
+            for letter, mask in self.masks[var.length][position].items()
+        }
+
+
+CREATORS = {
+    "sets": CrosswordCreator,
+    "bitsets": BitsetCrosswordCreator
+}
+
+
+def load_font(size):
+    """
+    Return FONT at `size` points, loading it the first time.
+    """
+    from PIL import ImageFont
+    if size not in FONTS:
+        FONTS[size] = ImageFont.truetype(FONT, size)
+    return FONTS[size]
+
+
+def glyph(letter, interior_size, font_size, lift):
+    """
+    Return an image of the white interior of a cell, with `letter` drawn
+    in it at `font_size`, centred and then raised by `lift` pixels.
+
+    The letter is drawn with a margin around the interior and cropped, so
+    that its position is never negative. PIL places text slightly
+    differently at negative coordinates, which on a cell-sized tile would
+    shift some rows of a glyph by a pixel.
+    """
+    from PIL import Image, ImageDraw
+    font = load_font(font_size)
+    margin = interior_size
+    size = interior_size + 1 + 2 * margin
+    tile = Image.new("RGBA", (size, size), "white")
+    draw = ImageDraw.Draw(tile)
+    _, _, w, h = draw.textbbox((0, 0), letter, font=font)
+    draw.text(
+        (margin + (interior_size - w) / 2,
+         margin + (interior_size - h) / 2 - lift),
+        letter, fill="black", font=font
+    )
+    return tile.crop(
+        (margin, margin, margin + interior_size + 1, margin + interior_size + 1)
+    )
+
+
+def glyph_atlas(letters, interior_size, font_size, lift):
+    """
+    Return an array stacking the tiles drawn by `glyph` in greyscale, and
+    the position of each letter's tile in it, drawing any of `letters`
+    not yet drawn.
+    """
+    import numpy as np
+    key = (interior_size, font_size, lift)
+    positions, atlas = ATLASES.get(key, (dict(), None))
+    missing = sorted(set(letters) - positions.keys())
+    if missing:
+        tiles = np.stack([
+            np.asarray(glyph(letter, interior_size, font_size, lift).convert("L"))
+            for letter in missing
+        ])
+        for letter in missing:
+            positions[letter] = len(positions)
+        atlas = tiles if atlas is None else np.concatenate([atlas, tiles])
+        ATLASES[key] = (positions, atlas)
+    return positions, atlas
+
+
+def luby(k):
+    """
+    Return the kth term of the Luby sequence 1, 1, 2, 1, 1, 2, 4, ...
+    """
+    power = 1
+    while power * 2 - 1 < k:
+        power *= 2
+    if power * 2 - 1 == k:
+        return power
+    return luby(k - power + 1)
+
+
+def portfolio_solve(structure, words, configs=PORTFOLIO,
+                    timeout=PORTFOLIO_TIMEOUT, creator="bitsets"):
+    """
+    Solve the crossword in the `structure` and `words` files with every
+    configuration in `configs` at once, each in its own process, where a
+    configuration gives keyword arguments for the `creator` class.
+
+    Return the first complete assignment found, the index of the
+    configuration that found it, and False. The other solvers are stopped
+    at once. If no solver succeeds, return None, None and whether the
+    search ran out of time: True if `timeout` seconds passed first, and
+    False if a solver showed that there is no solution.
+    """
+    stop = Event()
+    deadline = time.monotonic() + timeout
+    with ProcessPoolExecutor(
+        max_workers=len(configs), initializer=set_stop, initargs=(stop,)
+    ) as executor:
+        futures = {
+            executor.submit(
+                portfolio_worker, structure, words, creator, config, timeout
+            ): k
+            for k, config in enumerate(configs)
+        }
+
+        # Stop the other solvers however this ends, even if one of them
+        # raised, so that leaving the pool does not wait for them
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(
+                    pending,
+                    timeout=max(0, deadline - time.monotonic()),
+                    return_when=FIRST_COMPLETED
+                )
+                if not done:
+                    return None, None, True
+                for future in done:
+                    assignment, stopped = future.result()
+                    if assignment is not None:
+                        return assignment, futures[future], False
+                    if not stopped:
+                        return None, None, False
+        finally:
+            stop.set()
+    return None, None, True
+
+
+def set_stop(event):
+    """
+    Share the portfolio's stop event with a worker process.
+    """
+    global STOP
+    STOP = event
+
+
+def portfolio_worker(structure, words, creator, config, timeout):
+    """
+    Solve a crossword with one portfolio configuration, giving up when
+    the portfolio's stop event is set.
+
+    Return the assignment, or None, and whether the solver was stopped
+    before it finished searching.
+    """
+    solver = CREATORS[creator](Crossword(structure, words), **config)
+    assignment = solver.solve(timeout, STOP)
+    return assignment, assignment is None and solver.stopped()
+
 
 def main():
 
     # Check usage
-    if len(sys.argv) not in [3, 4]:
-        sys.exit("Usage: python generate.py structure words [output]")
+    portfolio = len(sys.argv) > 1 and sys.argv[1] == "--portfolio"
+    args = sys.argv[2:] if portfolio else sys.argv[1:]
+    if len(args) not in [2, 3]:
+        sys.exit("Usage: python generate.py [--portfolio] structure words [output]")
 
     # Parse command-line arguments
-    structure = sys.argv[1]
-    words = sys.argv[2]
-    output = sys.argv[3] if len(sys.argv) == 4 else None
+    structure = args[0]
+    words = args[1]
+    output = args[2] if len(args) == 3 else None
 
     # Generate crossword
     crossword = Crossword(structure, words)
-    creator = CrosswordCreator(crossword)
-    assignment = creator.solve()
+    timed_out = False
+    if portfolio:
+        creator = BitsetCrosswordCreator(crossword)
+        assignment, _, timed_out = portfolio_solve(structure, words)
+    else:
+        creator = CrosswordCreator(crossword)
+        assignment = creator.solve()
 
     # Print result
-    if assignment is None:
+    if timed_out:
+        print(f"No solution found within {PORTFOLIO_TIMEOUT} seconds.")
+    elif assignment is None:
         print("No solution.")
     else:
         creator.print(assignment)
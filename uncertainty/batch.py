@@ -0,0 +1,196 @@
+import csv
+import json
+import os
+import sys
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+import heredity
+
+# Junction trees compiled so far by this process, keyed by family shape
+TREES = dict()
+
+
+def main():
+
+    # Check for proper usage
+    if len(sys.argv) not in [2, 3]:
+        sys.exit("Usage: python batch.py (directory|manifest) [output]")
+    filenames = family_files(sys.argv[1])
+    output = sys.argv[2] if len(sys.argv) == 3 else None
+
+    # Score families in parallel, writing each result as it arrives
+    start = time.perf_counter()
+    latencies = []
+    compiled = 0
+    failed = 0
+    with open_output(output) as f:
+        if output is not None and output.endswith(".csv"):
+            write = csv_writer(f)
+        else:
+            write = json_writer(f)
+        with ProcessPoolExecutor() as executor:
+            results = executor.map(score_family, filenames, chunksize=16)
+            for result in results:
+                write(result)
+                latencies.append(result["seconds"])
+                if "error" in result:
+                    failed += 1
+                else:
+                    compiled += not result["cached"]
+    elapsed = time.perf_counter() - start
+
+    # Report throughput and latency
+    latencies.sort()
+    print(f"Families: {len(latencies)}", file=sys.stderr)
+    print(f"Failed: {failed}", file=sys.stderr)
+    print(f"Shapes compiled: {compiled}", file=sys.stderr)
+    print(f"Total time: {elapsed:.3f} s", file=sys.stderr)
+    if latencies:
+        print(
+            f"Throughput: {len(latencies) / elapsed:.1f} families/s",
+            file=sys.stderr
+        )
+        for label, q in [("p50", 0.5), ("p95", 0.95), ("max", 1)]:
+            latency = latencies[int(q * (len(latencies) - 1))]
+            print(f"Latency {label}: {latency * 1000:.2f} ms", file=sys.stderr)
+
+
+def family_files(source):
+    """
+    Return the family CSV files listed by `source`, which is either a
+    directory of CSV files or a manifest with one path per line.
+    Manifest paths are relative to the manifest's own directory.
+    """
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(source, filename)
+            for filename in os.listdir(source)
+            if filename.endswith(".csv")
+        )
+    with open(source) as f:
+        directory = os.path.dirname(source)
+        return [
+            os.path.join(directory, line.strip())
+            for line in f if line.strip()
+        ]
+
+
+def family_shape(people):
+    """
+    Rename people to their position in the file, so that families with the
+    same parent structure share a junction tree.
+
+    Return the renamed people and a hashable description of their shape.
+    """
+    position = {person: str(k) for k, person in enumerate(people)}
+    renamed = dict()
+    for person, data in people.items():
+        renamed[position[person]] = {
+            "name": position[person],
+            "mother": position.get(data["mother"]),
+            "father": position.get(data["father"]),
+            "trait": data["trait"]
+        }
+    shape = tuple(
+        (data["mother"], data["father"]) for data in renamed.values()
+    )
+    return renamed, shape
+
+
+def score_family(filename):
+    """
+    Compute gene and trait probabilities for one family file, reusing a
+    compiled junction tree if this process has already seen its shape.
+
+    If the file cannot be scored, return its error message instead, so
+    that one bad file does not stop the rest of the batch.
+    """
+    start = time.perf_counter()
+    try:
+        people = heredity.load_data(filename)
+        renamed, shape = family_shape(people)
+
+        cached = shape in TREES
+        if not cached:
+            TREES[shape] = heredity.compile_family(renamed)
+        probabilities = heredity.eliminate_probabilities(
+            renamed, TREES[shape]
+        )
+    except Exception as e:
+        return {
+            "file": filename,
+            "error": f"{type(e).__name__}: {e}",
+            "seconds": time.perf_counter() - start
+        }
+
+    return {
+        "file": filename,
+        "probabilities": {
+            person: probabilities[str(k)]
+            for k, person in enumerate(people)
+        },
+        "cached": cached,
+        "seconds": time.perf_counter() - start
+    }
+
+
+def open_output(output):
+    """
+    Open `output` for writing, or standard output if it is None.
+    """
+    if output is None:
+        return open(sys.stdout.fileno(), "w", closefd=False)
+    return open(output, "w", newline="")
+
+
+def json_writer(f):
+    """
+    Return a function writing each result to `f` as a line of JSON.
+    """
+    def write(result):
+        if "error" in result:
+            record = {"file": result["file"], "error": result["error"]}
+        else:
+            record = {
+                "file": result["file"],
+                "probabilities": result["probabilities"]
+            }
+        record["seconds"] = result["seconds"]
+        f.write(json.dumps(record) + "\n")
+        f.flush()
+    return write
+
+
+def csv_writer(f):
+    """
+    Return a function writing each result to `f` as one CSV row per person,
+    or as a single row with only an error for a file that failed.
+    """
+    writer = csv.writer(f)
+    writer.writerow([
+        "file", "name", "gene_2", "gene_1", "gene_0",
+        "trait_true", "trait_false", "seconds", "error"
+    ])
+
+    def write(result):
+        if "error" in result:
+            writer.writerow([
+                result["file"], "", "", "", "", "", "",
+                f"{result['seconds']:.6f}", result["error"]
+            ])
+        else:
+            for person, distribution in result["probabilities"].items():
+                writer.writerow([
+                    result["file"], person,
+                    *(f"{distribution['gene'][g]:.4f}" for g in [2, 1, 0]),
+                    *(f"{distribution['trait'][t]:.4f}" for t in [True, False]),
+                    f"{result['seconds']:.6f}", ""
+                ])
+        f.flush()
+    return write
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import heredity
+import pagerank
+
+ENUMERATE_SIZES = [5, 6, 7, 8, 9, 10, 11, 12]
+VECTORIZE_SIZES = [13, 14]
+ELIMINATE_SIZES = [10, 50, 100, 300, 600]
+SAMPLING_SIZES = [8, 50, 200]
+SAMPLES = 20000
+ITERATE_SIZES = [100, 300, 1000]
+SPARSE_SIZES = [10000, 100000, 1000000]
+WALK_PAGES = 10000
+WALK_SAMPLES = [10000, 1000000, 10000000]
+CRAWL_PAGES = 5000
+UPDATE_PAGES = 100000
+UPDATE_EDITS = [10, 100, 1000, 10000]
+SOLVER_SIZES = [1000, 10000, 100000]
+DISK_SIZES = [100000, 1000000]
+PERSONAL_PAGES = 100000
+PERSONAL_SEEDS = 5
+PERSONAL_TOLERANCES = [1e-3, 1e-4, 1e-5]
+TOP = 10
+
+
+def main():
+    if len(sys.argv) not in [2, 3] or sys.argv[1] not in BENCHMARKS:
+        sys.exit(f"Usage: python benchmark.py {'|'.join(BENCHMARKS)} [seed]")
+    seed = int(sys.argv[2]) if len(sys.argv) == 3 else 0
+    BENCHMARKS[sys.argv[1]](seed)
+
+
+def benchmark_heredity(seed):
+    """
+    Compare heredity inference methods on generated families.
+    """
+    # Import NumPy before timing anything
+    heredity.vectorize_probabilities(generate_family(2, seed))
+
+    print("Exact inference by family size")
+    print(
+        f"  {'people':>6} {'method':>10} {'seconds':>9} "
+        f"{'peak KiB':>9} {'max error':>10}"
+    )
+    for n in ENUMERATE_SIZES:
+        people = generate_family(n, seed)
+        exact, elapsed, peak = profiled(heredity.enumerate_probabilities, people)
+        print(f"  {n:>6} {'enumerate':>10} {elapsed:>9.3f} {peak:>9.1f}")
+        for method in ["vectorize", "eliminate"]:
+            result, elapsed, peak = profiled(heredity.METHODS[method], people)
+            error = max_error(exact, result)
+            print(
+                f"  {n:>6} {method:>10} {elapsed:>9.3f} "
+                f"{peak:>9.1f} {error:>10.2e}"
+            )
+    for n in VECTORIZE_SIZES:
+        people = generate_family(n, seed)
+        _, elapsed, peak = profiled(heredity.vectorize_probabilities, people)
+        print(f"  {n:>6} {'vectorize':>10} {elapsed:>9.3f} {peak:>9.1f}")
+    for n in ELIMINATE_SIZES:
+        people = generate_family(n, seed)
+        _, elapsed, peak = profiled(heredity.eliminate_probabilities, people)
+        print(f"  {n:>6} {'eliminate':>10} {elapsed:>9.3f} {peak:>9.1f}")
+
+    print(f"Approximate inference against exact marginals (n = {SAMPLES})")
+    print(
+        f"  {'people':>6} {'method':>10} {'samples/s':>10} "
+        f"{'max error':>10}  diagnostic"
+    )
+    for n in SAMPLING_SIZES:
+        people = generate_family(n, seed)
+        exact = heredity.eliminate_probabilities(people)
+        for method, sampler in heredity.SAMPLERS.items():
+            (result, diagnostic), elapsed = timed(
+                sampler, people, SAMPLES
+            )
+            name, value = next(iter(diagnostic.items()))
+            print(
+                f"  {n:>6} {method:>10} {SAMPLES / elapsed:>10.0f} "
+                f"{max_error(exact, result):>10.4f}  {name} {value:.3f}"
+            )
+
+
+def benchmark_pagerank(seed):
+    """
+    Compare PageRank methods on generated corpora.
+    """
+
+    # Import NumPy and SciPy before timing anything
+    pagerank.sparse_pagerank(generate_corpus(2, seed), pagerank.DAMPING)
+
+    print("Power iteration time by corpus size")
+    print(f"  {'pages':>8} {'method':>8} {'seconds':>9} {'max error':>10}")
+    for n in ITERATE_SIZES:
+        corpus = generate_corpus(n, seed)
+        exact, elapsed = timed(pagerank.iterate_pagerank, corpus, pagerank.DAMPING)
+        print(f"  {n:>8} {'iterate':>8} {elapsed:>9.3f}")
+        result, elapsed = timed(pagerank.sparse_pagerank, corpus, pagerank.DAMPING)
+        error = max(abs(exact[page] - result[page]) for page in corpus)
+        print(f"  {n:>8} {'sparse':>8} {elapsed:>9.3f} {error:>10.2e}")
+    for n in SPARSE_SIZES:
+        corpus = generate_corpus(n, seed)
+        _, elapsed = timed(pagerank.sparse_pagerank, corpus, pagerank.DAMPING)
+        print(f"  {n:>8} {'sparse':>8} {elapsed:>9.3f}")
+
+    print(f"Random surfer sampling over {WALK_PAGES} pages")
+    print(
+        f"  {'samples':>8} {'method':>8} {'processes':>9} "
+        f"{'samples/s':>10} {'l1 error':>10}"
+    )
+    corpus = generate_corpus(WALK_PAGES, seed)
+    exact = pagerank.sparse_pagerank(corpus, pagerank.DAMPING)
+    runs = [(WALK_SAMPLES[0], "sample", 1)] + [
+        (n, "walk", processes)
+        for n in WALK_SAMPLES for processes in sorted({1, os.cpu_count()})
+    ]
+    for n, method, processes in runs:
+        if method == "sample":
+            result, elapsed = timed(
+                pagerank.sample_pagerank, corpus, pagerank.DAMPING, n
+            )
+        else:
+            result, elapsed = timed(
+                pagerank.walk_pagerank, corpus, pagerank.DAMPING, n,
+                1000, processes
+            )
+        error = sum(abs(exact[page] - result[page]) for page in corpus)
+        print(
+            f"  {n:>8} {method:>8} {processes:>9} "
+            f"{n / elapsed:>10.0f} {error:>10.2e}"
+        )
+
+
+def benchmark_update(seed):
+    """
+    Compare incremental PageRank updates from link deltas with rebuilding
+    the link matrix and iterating from scratch.
+    """
+    import numpy as np
+
+    rng = random.Random(seed)
+    corpus = generate_corpus(UPDATE_PAGES, seed)
+    incremental, setup = timed(pagerank.IncrementalPageRank, corpus)
+    print(f"PageRank updates on {UPDATE_PAGES} pages (setup {setup:.3f} s)")
+    print(
+        f"  {'edits':>6} {'update s':>8} {'its':>4} "
+        f"{'build s':>8} {'cold its':>8} {'cold s':>7} {'l1 diff':>9}"
+    )
+    for edits in UPDATE_EDITS:
+
+        # Change the links of most edited pages, remove some, and add as
+        # many new pages linked from random pages
+        pages = list(corpus)
+        linked, unlinked, removed = [], [], []
+        edited = rng.sample(pages, edits)
+        for page in edited[edits // 10:]:
+            links = set(rng.sample(pages, rng.randint(0, 10))) - {page}
+            linked.extend((page, link) for link in links - corpus[page])
+            unlinked.extend((page, link) for link in corpus[page] - links)
+            corpus[page] = links
+        for page in edited[:edits // 10]:
+            removed.append(page)
+            del corpus[page]
+        added = [f"new{seed}-{edits}-{k}.html" for k in range(edits // 10)]
+        for page in added:
+            corpus[page] = set()
+            source = rng.choice(pages)
+            linked.append((source, page))
+            if source in corpus:
+                corpus[source].add(page)
+        for page in corpus:
+            corpus[page] -= set(removed)
+        iterations, update = timed(
+            incremental.update, added, removed, linked, unlinked
+        )
+
+        # Rebuild and solve from uniform ranks for comparison
+        (order, matrix, dangling), build = timed(pagerank.link_matrix, corpus)
+        (ranks, cold), elapsed = timed(
+            pagerank.power_iteration, matrix, dangling,
+            np.full(len(order), 1 / len(order)),
+            pagerank.DAMPING, pagerank.TOLERANCE
+        )
+        updated = incremental.ranks()
+        difference = sum(
+            abs(updated[page] - rank)
+            for page, rank in zip(order, ranks.tolist())
+        )
+        print(
+            f"  {edits:>6} {update:>8.3f} {iterations:>4} {build:>8.3f} "
+            f"{cold:>8} {elapsed:>7.3f} {difference:>9.2e}"
+        )
+
+
+def benchmark_solvers(seed):
+    """
+    Compare the iterative PageRank solvers on generated corpora.
+    """
+
+    # Import NumPy and SciPy before timing anything
+    pagerank.sparse_pagerank(generate_corpus(2, seed), pagerank.DAMPING)
+
+    print(f"PageRank solvers (tolerance = {pagerank.TOLERANCE})")
+    print(
+        f"  {'pages':>7} {'links':>5} {'method':>12} {'iterations':>10} "
+        f"{'total ms':>9} {'ms/iter':>8} {'residual':>9}"
+    )
+    for n in SOLVER_SIZES:
+        for links in [1, 5]:
+            corpus = generate_corpus(n, seed, links)
+            for method in pagerank.SOLVERS:
+                _, stats = pagerank.solve_pagerank(
+                    corpus, pagerank.DAMPING, method
+                )
+                total = sum(stats["times"]) * 1000
+                print(
+                    f"  {n:>7} {links:>5} {method:>12} "
+                    f"{stats['iterations']:>10} {total:>9.2f} "
+                    f"{total / stats['iterations']:>8.3f} "
+                    f"{stats['residuals'][-1]:>9.2e}"
+                )
+
+
+def benchmark_disk(seed):
+    """
+    Compare PageRank over memory-mapped edge files with the in-memory
+    sparse solver.
+    """
+    import numpy as np
+
+    print("Edges processed per second by power iteration")
+    print(
+        f"  {'pages':>8} {'edges':>9} {'method':>10} {'workers':>7} "
+        f"{'seconds':>8} {'edges/s':>11}"
+    )
+    for n in DISK_SIZES:
+        corpus = generate_corpus(n, seed)
+        pages, matrix, dangling = pagerank.link_matrix(corpus)
+        edges = matrix.nnz
+        ranks = np.full(n, 1 / n)
+        (_, iterations), elapsed = timed(
+            pagerank.power_iteration, matrix, dangling, ranks,
+            pagerank.DAMPING, pagerank.TOLERANCE
+        )
+        print(
+            f"  {n:>8} {edges:>9} {'memory':>10} {1:>7} "
+            f"{elapsed:>8.3f} {edges * iterations / elapsed:>11.0f}"
+        )
+
+        # Both solvers take the same number of iterations
+        with tempfile.TemporaryDirectory() as directory:
+            index = {page: i for i, page in enumerate(pages)}
+            pagerank.save_edges(pages, np.array(
+                [(index[page], index[link])
+                 for page in pages for link in corpus[page]],
+                dtype=np.int64
+            ).reshape(-1, 2), directory)
+            for workers in sorted({1, os.cpu_count()}):
+                _, elapsed = timed(
+                    pagerank.disk_pagerank, directory, pagerank.DAMPING,
+                    pagerank.TOLERANCE, 1 << 18, workers
+                )
+                print(
+                    f"  {n:>8} {edges:>9} {'disk':>10} {workers:>7} "
+                    f"{elapsed:>8.3f} {edges * iterations / elapsed:>11.0f}"
+                )
+
+
+def benchmark_personal(seed):
+    """
+    Time personalised top-k queries by forward push, and compare them
+    with personalised ranks from power iteration.
+    """
+    import numpy as np
+
+    rng = random.Random(seed)
+    corpus = generate_corpus(PERSONAL_PAGES, seed)
+    pages, matrix, dangling = pagerank.link_matrix(corpus)
+    index = {page: i for i, page in enumerate(pages)}
+    personal = pagerank.PersonalizedPageRank(corpus)
+
+    print(f"Personalised top-{TOP} queries on {PERSONAL_PAGES} pages")
+    print(
+        f"  {'tolerance':>9} {'query ms':>9} {'repeat ms':>9} "
+        f"{'power ms':>9} {'top-k hits':>10}"
+    )
+    seeds = rng.sample(pages, PERSONAL_SEEDS)
+    for tolerance in PERSONAL_TOLERANCES:
+        query = repeat = power = hits = 0
+        for page in seeds:
+            top, elapsed = timed(personal.top, page, TOP, tolerance)
+            query += elapsed
+            _, elapsed = timed(personal.top, page, TOP, tolerance)
+            repeat += elapsed
+
+            # Personalised power iteration, restarting at the seed
+            start = time.perf_counter()
+            restart = np.zeros(len(pages))
+            restart[index[page]] = 1
+            ranks = restart.copy()
+            while True:
+                new_ranks = (1 - pagerank.DAMPING) * restart + pagerank.DAMPING * (
+                    matrix @ ranks + ranks[dangling].sum() * restart
+                )
+                change = np.abs(new_ranks - ranks).sum()
+                ranks = new_ranks
+                if change < pagerank.TOLERANCE:
+                    break
+            power += time.perf_counter() - start
+            best = {pages[i] for i in np.argsort(-ranks)[:TOP]}
+            hits += len(best & {p for p, _ in top})
+
+        print(
+            f"  {tolerance:>9.0e} {query / len(seeds) * 1000:>9.2f} "
+            f"{repeat / len(seeds) * 1000:>9.3f} "
+            f"{power / len(seeds) * 1000:>9.2f} "
+            f"{hits / len(seeds):>7.1f}/{TOP}"
+        )
+
+
+def benchmark_crawl(seed):
+    """
+    Compare crawlers on a generated corpus written to disk.
+    """
+    corpus = generate_corpus(CRAWL_PAGES, seed)
+    with tempfile.TemporaryDirectory() as directory:
+        pages = os.path.join(directory, "corpus")
+        cache = os.path.join(directory, "links.json")
+        write_corpus(corpus, pages, seed)
+
+        print(f"Crawl time for {CRAWL_PAGES} pages")
+        _, elapsed = timed(pagerank.crawl, pages)
+        print(f"  {'crawl':<24} {elapsed:>9.3f} s")
+        _, elapsed = timed(pagerank.crawl_edges, pages)
+        print(f"  {'crawl_edges':<24} {elapsed:>9.3f} s")
+        _, elapsed = timed(pagerank.crawl_edges, pages, cache)
+        print(f"  {'crawl_edges, cold cache':<24} {elapsed:>9.3f} s")
+        _, elapsed = timed(pagerank.crawl_edges, pages, cache)
+        print(f"  {'crawl_edges, warm cache':<24} {elapsed:>9.3f} s")
+
+        # Touch one page in a hundred
+        for page in list(corpus)[::100]:
+            os.utime(os.path.join(pages, page), ns=(0, 0))
+        _, elapsed = timed(pagerank.crawl_edges, pages, cache)
+        print(f"  {'crawl_edges, 1% changed':<24} {elapsed:>9.3f} s")
+
+
+def write_corpus(corpus, directory, seed, words=2000):
+    """
+    Write each page of `corpus` to `directory` as an HTML file, with up to
+    `words` words of filler text around each link.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory)
+    for page, links in corpus.items():
+        with open(os.path.join(directory, page), "w") as f:
+            f.write("<html><body>\n")
+            for link in links:
+                f.write(f"<p>{'lorem ipsum ' * rng.randint(0, words)}</p>\n")
+                f.write(f'<a class="link" href="{link}">{link}</a>\n')
+            f.write("</body></html>\n")
+
+
+def generate_corpus(n, seed, links=5):
+    """
+    Generate a corpus of `n` pages, in the form returned by
+    `pagerank.crawl`, where each page links to between 0 and
+    `2 * links` other pages at random.
+    """
+    rng = random.Random(seed)
+    pages = [f"{k}.html" for k in range(n)]
+    corpus = dict()
+    for k, page in enumerate(pages):
+        count = min(rng.randint(0, 2 * links), n - 1)
+        targets = set()
+        while len(targets) < count:
+            target = rng.randrange(n)
+            if target != k:
+                targets.add(pages[target])
+        corpus[page] = targets
+    return corpus
+
+
+def generate_family(n, seed, observed=0.5):
+    """
+    Generate a family of `n` people, loaded through `heredity.load_data`.
+
+    Starting from one founder, each person in turn has children with a new
+    founder, giving a pedigree that spans several generations. Each trait
+    is known with probability `observed`.
+    """
+    rng = random.Random(seed)
+    rows = []
+
+    def add(mother="", father=""):
+        name = f"Person{len(rows)}"
+        trait = rng.choice(["0", "1"]) if rng.random() < observed else ""
+        rows.append([name, mother, father, trait])
+        return name
+
+    parents = [add()]
+    while len(rows) < n:
+        parent = parents.pop(0) if parents else add()
+        if len(rows) == n:
+            break
+        spouse = add()
+        for _ in range(rng.randint(1, 3)):
+            if len(rows) == n:
+                break
+            parents.append(add(parent, spouse))
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "family.csv")
+        with open(filename, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["name", "mother", "father", "trait"])
+            writer.writerows(rows)
+        return heredity.load_data(filename)
+
+
+def timed(function, *args):
+    """
+    Return the result of calling `function` and the seconds it took.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def profiled(function, *args):
+    """
+    Return the result of calling `function`, the seconds it took, and the
+    peak memory it allocated in KiB. Timings include tracing overhead.
+    """
+    tracemalloc.start()
+    result, elapsed = timed(function, *args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024
+
+
+def max_error(expected, actual):
+    """
+    Return the largest absolute difference between two sets of
+    heredity probabilities.
+    """
+    return max(
+        abs(expected[person][field][value] - actual[person][field][value])
+        for person in expected
+        for field in expected[person]
+        for value in expected[person][field]
+    )
+
+
+BENCHMARKS = {
+    "heredity": benchmark_heredity,
+    "pagerank": benchmark_pagerank,
+    "crawl": benchmark_crawl,
+    "update": benchmark_update,
+    "personal": benchmark_personal,
+    "solvers": benchmark_solvers,
+    "disk": benchmark_disk
+}
+
+
+if __name__ == "__main__":
+    main()
@@ -36,16 +36,58 @@ PROBS = {
     "mutation": 0.01
 }
 
+# Default number of samples for approximate inference
+SAMPLES = 10000
+
+# Possible numbers of copies of the gene
+GENES = (0, 1, 2)
+
+# Probability that a parent with each number of copies passes the gene on
+PASSING = {
+    2: 1 - PROBS["mutation"],
+    1: 0.5,
+    0: PROBS["mutation"]
+}
+
 
 def main():
 
     # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
+    if len(sys.argv) not in [2, 3]:
+        sys.exit(
+            "Usage: python heredity.py data.csv "
+            f"[{'|'.join(list(METHODS) + list(SAMPLERS))}]"
+        )
+    method = sys.argv[2] if len(sys.argv) == 3 else "enumerate"
+    if method not in METHODS and method not in SAMPLERS:
+        sys.exit(f"Unknown method: {method}")
     people = load_data(sys.argv[1])
 
-    # Keep track of gene and trait probabilities for each person
-    probabilities = {
+    # Compute gene and trait probabilities for each person
+    if method in SAMPLERS:
+        probabilities, diagnostic = SAMPLERS[method](people)
+        print(f"{method.capitalize()} sampling (n = {SAMPLES})")
+        for name, value in diagnostic.items():
+            print(f"  {name}: {value:.4f}")
+    else:
+        probabilities = METHODS[method](people)
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                print(f"    {value}: {p:.4f}")
+
+
+def empty_probabilities(people):
+    """
+    Return a probability distribution for each person with every
+    gene and trait value set to 0.
+    """
+    return {
         person: {
             "gene": {
                 2: 0,
@@ -60,38 +102,582 @@ def main():
         for person in people
     }
 
-    # Loop over all sets of people who might have the trait
-    names = set(people)
-    for have_trait in powerset(names):
 
-        # Check if current set of people violates known information
-        fails_evidence = any(
-            (people[person]["trait"] is not None and
-             people[person]["trait"] != (person in have_trait))
-            for person in names
+def enumerate_probabilities(people):
+    """
+    Compute each person's gene and trait distribution by summing the
+    joint probability of every assignment consistent with the evidence.
+    """
+
+    # Keep track of gene and trait probabilities for each person
+    probabilities = empty_probabilities(people)
+    order = topological_order(people)
+    bits = [(person, 1 << k) for k, person in enumerate(order)]
+
+    # Loop over every gene assignment, one pair of bitmasks at a time
+    for one_gene, two_genes, p in gene_assignments(people, order):
+        for person, bit in bits:
+            count = 2 if two_genes & bit else 1 if one_gene & bit else 0
+            probabilities[person]["gene"][count] += p
+
+            # Unknown traits are split by their probability given the gene
+            trait = people[person]["trait"]
+            if trait is None:
+                for value, q in PROBS["trait"][count].items():
+                    probabilities[person]["trait"][value] += p * q
+            else:
+                probabilities[person]["trait"][trait] += p
+
+    # Ensure probabilities sum to 1
+    normalize(probabilities)
+    return probabilities
+
+
+def gene_assignments(people, order):
+    """
+    Lazily yield every assignment of gene counts to `people` with nonzero
+    probability, as `(one_gene, two_genes, p)`. Bit k of each mask is set
+    if `order[k]` has one or two copies of the gene, respectively, and `p`
+    is the joint probability of those gene counts and the known traits.
+
+    People are assigned in `order`, which must list parents before their
+    children. Assignments sharing a prefix share its partial product, and
+    a branch is dropped as soon as that product reaches 0. Unknown traits
+    are summed out, since their probabilities add up to 1.
+    """
+    position = {person: k for k, person in enumerate(order)}
+
+    def count(one_gene, two_genes, person):
+        bit = 1 << position[person]
+        return 2 if two_genes & bit else 1 if one_gene & bit else 0
+
+    def extend(k, one_gene, two_genes, p):
+        if k == len(order):
+            yield one_gene, two_genes, p
+            return
+        person = people[order[k]]
+        for genes in GENES:
+            if person["mother"] is None:
+                q = PROBS["gene"][genes]
+            else:
+                q = inherit_probability(
+                    genes,
+                    count(one_gene, two_genes, person["mother"]),
+                    count(one_gene, two_genes, person["father"])
+                )
+            if person["trait"] is not None:
+                q *= PROBS["trait"][genes][person["trait"]]
+            if p * q == 0:
+                continue
+            yield from extend(
+                k + 1,
+                one_gene | (1 << k if genes == 1 else 0),
+                two_genes | (1 << k if genes == 2 else 0),
+                p * q
+            )
+
+    yield from extend(0, 0, 0, 1)
+
+
+def topological_order(people):
+    """
+    Return a list of the names in `people`, with parents before children.
+    """
+    order = []
+    placed = set()
+
+    def place(person):
+        if person in placed:
+            return
+        placed.add(person)
+        for parent in [people[person]["mother"], people[person]["father"]]:
+            if parent is not None:
+                place(parent)
+        order.append(person)
+
+    for person in people:
+        place(person)
+    return order
+
+
+def vectorize_probabilities(people, chunk_size=3 ** 10):
+    """
+    Compute each person's gene and trait distribution like
+    `enumerate_probabilities`, but with NumPy array operations over
+    `chunk_size` gene assignments at a time.
+
+    Assignment `a` gives person k `(a // 3 ** k) % 3` copies of the gene.
+    Unknown traits are summed out, as in `gene_assignments`.
+    """
+    import numpy as np
+
+    order = topological_order(people)
+    position = {person: k for k, person in enumerate(order)}
+    n = len(order)
+    gene, inherit, trait = probability_tables()
+
+    powers = 3 ** np.arange(n, dtype=np.int64)
+    offsets = 3 * np.arange(n)
+    totals = np.zeros(3 * n)
+    for start in range(0, 3 ** n, chunk_size):
+        index = np.arange(start, min(start + chunk_size, 3 ** n), dtype=np.int64)
+        counts = (index[:, None] // powers) % 3
+
+        # Multiply in each person's factor for the whole chunk at once
+        p = np.ones(len(index))
+        for k, person in enumerate(order):
+            mother = people[person]["mother"]
+            father = people[person]["father"]
+            if mother is None:
+                p *= gene[counts[:, k]]
+            else:
+                p *= inherit[
+                    counts[:, k],
+                    counts[:, position[mother]],
+                    counts[:, position[father]]
+                ]
+            if people[person]["trait"] is not None:
+                p *= trait[people[person]["trait"]][counts[:, k]]
+
+        # Add each assignment's probability to every person's gene count
+        totals += np.bincount(
+            (counts + offsets).ravel(),
+            weights=np.repeat(p, n),
+            minlength=3 * n
         )
-        if fails_evidence:
-            continue
 
-        # Loop over all sets of people who might have the gene
-        for one_gene in powerset(names):
-            for two_genes in powerset(names - one_gene):
+    return array_probabilities(people, order, totals.reshape(n, 3))
 
-                # Update probabilities with new joint probability
-                p = joint_probability(people, one_gene, two_genes, have_trait)
-                update(probabilities, one_gene, two_genes, have_trait, p)
 
-    # Ensure probabilities sum to 1
+def probability_tables():
+    """
+    Return `PROBS` as NumPy arrays: the unconditional gene distribution,
+    an inheritance table indexed by child, mother and father gene counts,
+    and a dictionary mapping each trait value to its probability by gene.
+    """
+    import numpy as np
+
+    gene = np.array([PROBS["gene"][g] for g in GENES])
+    inherit = np.array([
+        [[inherit_probability(g, m, f) for f in GENES] for m in GENES]
+        for g in GENES
+    ])
+    trait = {
+        value: np.array([PROBS["trait"][g][value] for g in GENES])
+        for value in [True, False]
+    }
+    return gene, inherit, trait
+
+
+def array_probabilities(people, order, totals):
+    """
+    Return normalized probabilities from `totals`, an array whose row k
+    holds the unnormalized gene distribution of `order[k]`. Unknown
+    traits follow from the gene distribution.
+    """
+    _, _, trait = probability_tables()
+    probabilities = empty_probabilities(people)
+    for k, person in enumerate(order):
+        marginal = totals[k]
+        for g in GENES:
+            probabilities[person]["gene"][g] = float(marginal[g])
+        for value in [True, False]:
+            if people[person]["trait"] is None:
+                probabilities[person]["trait"][value] = float(
+                    marginal @ trait[value]
+                )
+            else:
+                probabilities[person]["trait"][value] = float(
+                    people[person]["trait"] == value
+                )
+
     normalize(probabilities)
+    return probabilities
 
-    # Print results
+
+def likelihood_weighting(people, samples=SAMPLES, batch=1000, seed=None):
+    """
+    Estimate each person's gene and trait distribution by likelihood
+    weighting: draw gene counts parents-first from `PROBS`, and weight
+    each sample by the probability of the known traits.
+
+    Samples are drawn `batch` at a time with NumPy. Return the
+    probabilities and a diagnostic with the effective sample size.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    order = topological_order(people)
+    position = {person: k for k, person in enumerate(order)}
+    n = len(order)
+    gene, inherit, trait = probability_tables()
+    gene_cdf = np.cumsum(gene)
+
+    # Weights are kept as logs and totals scaled by exp(-shift) to avoid underflow
+    totals = np.zeros((n, 3))
+    shift = -np.inf
+    weight_sum = 0
+    square_sum = 0
+    for start in range(0, samples, batch):
+        size = min(batch, samples - start)
+        counts = np.empty((size, n), dtype=np.int64)
+        log_weights = np.zeros(size)
+        for k, person in enumerate(order):
+            u = rng.random(size)
+            mother = people[person]["mother"]
+            father = people[person]["father"]
+            if mother is None:
+                counts[:, k] = np.searchsorted(gene_cdf, u, side="right")
+            else:
+                m = counts[:, position[mother]]
+                f = counts[:, position[father]]
+                zero = inherit[0, m, f]
+                counts[:, k] = (u >= zero).astype(int) + (u >= zero + inherit[1, m, f])
+            if people[person]["trait"] is not None:
+                log_weights += np.log(
+                    trait[people[person]["trait"]][counts[:, k]]
+                )
+
+        # Rescale what has been accumulated so far if weights grew
+        new_shift = max(shift, log_weights.max())
+        scale = np.exp(shift - new_shift)
+        totals *= scale
+        weight_sum *= scale
+        square_sum *= scale ** 2
+        shift = new_shift
+
+        weights = np.exp(log_weights - shift)
+        weight_sum += weights.sum()
+        square_sum += (weights ** 2).sum()
+        for k in range(n):
+            totals[k] += np.bincount(counts[:, k], weights=weights, minlength=3)
+
+    diagnostic = {"effective samples": float(weight_sum ** 2 / square_sum)}
+    return array_probabilities(people, order, totals), diagnostic
+
+
+def gibbs_sampling(people, samples=SAMPLES, chains=100, burn_in=100,
+                   seed=None):
+    """
+    Estimate each person's gene and trait distribution by Gibbs sampling:
+    repeatedly redraw each person's gene count given everyone else's,
+    from their parents, their children and their known trait.
+
+    All `chains` chains are updated together with NumPy, and `samples`
+    are split between them after `burn_in` sweeps. Return the
+    probabilities and a diagnostic with the largest Gelman-Rubin R-hat
+    of any person's gene count.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    order = topological_order(people)
+    position = {person: k for k, person in enumerate(order)}
+    n = len(order)
+    gene, inherit, trait = probability_tables()
+
+    # Remember each person's children, and who they had them with
+    children = [[] for _ in order]
+    for person in order:
+        mother = people[person]["mother"]
+        father = people[person]["father"]
+        if mother is not None:
+            k = position[person]
+            m = position[mother]
+            f = position[father]
+            children[m].append((k, f, True))
+            children[f].append((k, m, False))
+
+    # Start every chain from a draw of the gene distribution
+    counts = rng.choice(3, size=(chains, n), p=gene)
+    sweeps = -(-samples // chains)
+    totals = np.zeros((n, 3))
+    sums = np.zeros((chains, n))
+    squares = np.zeros((chains, n))
+    for sweep in range(burn_in + sweeps):
+        for k, person in enumerate(order):
+
+            # Weigh each possible gene count for every chain at once
+            weights = np.empty((chains, 3))
+            mother = people[person]["mother"]
+            for g in GENES:
+                if mother is None:
+                    w = np.full(chains, gene[g])
+                else:
+                    w = inherit[
+                        g,
+                        counts[:, position[mother]],
+                        counts[:, position[people[person]["father"]]]
+                    ]
+                if people[person]["trait"] is not None:
+                    w = w * trait[people[person]["trait"]][g]
+                for child, other, is_mother in children[k]:
+                    if is_mother:
+                        w = w * inherit[counts[:, child], g, counts[:, other]]
+                    else:
+                        w = w * inherit[counts[:, child], counts[:, other], g]
+                weights[:, g] = w
+
+            cdf = np.cumsum(weights, axis=1)
+            u = rng.random(chains) * cdf[:, 2]
+            counts[:, k] = (u >= cdf[:, 0]).astype(int) + (u >= cdf[:, 1])
+
+        if sweep >= burn_in:
+            for k in range(n):
+                totals[k] += np.bincount(counts[:, k], minlength=3)
+            sums += counts
+            squares += counts ** 2
+
+    # Compare the spread within chains to the spread between chains
+    means = sums / sweeps
+    within = ((squares - sweeps * means ** 2) / max(sweeps - 1, 1)).mean(axis=0)
+    between = means.var(axis=0, ddof=1) if chains > 1 else np.zeros(n)
+    mixed = within > 0
+    r_hat = np.sqrt(
+        ((sweeps - 1) / sweeps * within[mixed] + between[mixed])
+        / within[mixed]
+    )
+    diagnostic = {"max r-hat": float(r_hat.max()) if mixed.any() else 1.0}
+    return array_probabilities(people, order, totals), diagnostic
+
+
+def eliminate_probabilities(people, tree=None):
+    """
+    Compute each person's gene and trait distribution exactly, by
+    compiling the family into a Bayesian network over gene counts and
+    passing messages along a junction tree built from a min-fill
+    elimination ordering.
+
+    Cost grows with the size of the largest clique rather than
+    exponentially with the number of people. A `tree` from
+    `compile_family` may be passed in to skip compiling it again.
+    """
+    if tree is None:
+        tree = compile_family(people)
+    cliques = tree["cliques"]
+    parent = tree["parent"]
+    children = tree["children"]
+
+    # Multiply each clique's factors together once
+    factors = dict(zip(people, gene_factors(people)))
+    potentials = [
+        multiply(clique, [factors[person] for person in tree["assigned"][k]])
+        for k, clique in enumerate(cliques)
+    ]
+
+    # Upward pass, from the first eliminated variable to the roots
+    up = [None] * len(cliques)
+    for k, clique in enumerate(cliques):
+        if parent[k] is not None:
+            incoming = [up[c] for c in children[k]]
+            table = multiply(clique, incoming, potentials[k])
+            up[k] = marginalize(clique, table, clique[1:])
+
+    # Downward pass, from the roots back out to every clique
+    down = [None] * len(cliques)
+    for k in reversed(range(len(cliques))):
+        for child in children[k]:
+            incoming = [up[c] for c in children[k] if c != child]
+            if down[k] is not None:
+                incoming.append(down[k])
+            table = multiply(cliques[k], incoming, potentials[k])
+            down[child] = marginalize(cliques[k], table, cliques[child][1:])
+
+    # Read off each person's gene distribution from their own clique
+    probabilities = empty_probabilities(people)
+    for k, clique in enumerate(cliques):
+        incoming = [up[c] for c in children[k]]
+        if down[k] is not None:
+            incoming.append(down[k])
+        _, table = marginalize(
+            clique, multiply(clique, incoming, potentials[k]), clique[:1]
+        )
+        person = clique[0]
+        for (count,), p in table.items():
+            probabilities[person]["gene"][count] = p
+            for trait in [True, False]:
+                if people[person]["trait"] is None:
+                    probabilities[person]["trait"][trait] += (
+                        p * PROBS["trait"][count][trait]
+                    )
+                else:
+                    probabilities[person]["trait"][trait] = float(
+                        people[person]["trait"] == trait
+                    )
+
+    normalize(probabilities)
+    return probabilities
+
+
+def compile_family(people):
+    """
+    Return the junction tree used by `eliminate_probabilities` for a family.
+    It depends only on who each person's parents are, not on their traits.
+
+    The tree is a dictionary with keys:
+        * "cliques", a list with one tuple of people per eliminated person,
+          starting with that person;
+        * "parent", the index of the clique each clique sends its message
+          to, or None for a root;
+        * "children", the indices of the cliques sending messages to each;
+        * "assigned", the people whose factors each clique multiplies in.
+    """
+    factors = gene_factors(people)
+    order = min_fill_order(factors)
+    position = {var: k for k, var in enumerate(order)}
+
+    # Build one clique per eliminated variable, as variable elimination would
+    neighbors = {var: set() for var in order}
+    for variables, _ in factors:
+        for var in variables:
+            neighbors[var].update(variables)
+    cliques = []
+    for var in order:
+        clique = (var,) + tuple(
+            sorted(neighbors[var] - {var}, key=position.get)
+        )
+        cliques.append(clique)
+        for other in clique[1:]:
+            neighbors[other].update(v for v in clique[1:] if v != other)
+            neighbors[other].discard(var)
+
+    # Each clique sends its message to the clique of its next variable
+    parent = [position[clique[1]] if len(clique) > 1 else None
+              for clique in cliques]
+    children = [[] for _ in cliques]
+    for k, p in enumerate(parent):
+        if p is not None:
+            children[p].append(k)
+
+    # Assign every factor to the first clique containing its variables
+    assigned = [[] for _ in cliques]
+    for variables, _ in factors:
+        assigned[min(position[var] for var in variables)].append(variables[0])
+
+    return {
+        "cliques": cliques,
+        "parent": parent,
+        "children": children,
+        "assigned": assigned
+    }
+
+
+def gene_factors(people):
+    """
+    Return one factor per person for the probability of their gene count,
+    given their parents' gene counts and any evidence about their trait.
+
+    A factor is a pair of a tuple of people and a dictionary mapping
+    each tuple of their gene counts to a probability.
+    """
+    factors = []
     for person in people:
-        print(f"{person}:")
-        for field in probabilities[person]:
-            print(f"  {field.capitalize()}:")
-            for value in probabilities[person][field]:
-                p = probabilities[person][field][value]
-                print(f"    {value}: {p:.4f}")
+        mother = people[person]["mother"]
+        father = people[person]["father"]
+        trait = people[person]["trait"]
+        if mother is None:
+            variables = (person,)
+        else:
+            variables = (person, mother, father)
+
+        table = dict()
+        for counts in itertools.product(GENES, repeat=len(variables)):
+            if mother is None:
+                p = PROBS["gene"][counts[0]]
+            else:
+                p = inherit_probability(counts[0], counts[1], counts[2])
+            if trait is not None:
+                p *= PROBS["trait"][counts[0]][trait]
+            table[counts] = p
+        factors.append((variables, table))
+    return factors
+
+
+def inherit_probability(count, mother, father):
+    """
+    Return the probability that a child has `count` copies of the gene,
+    given the number of copies their mother and father have.
+    """
+    p_mom = PASSING[mother]
+    p_dad = PASSING[father]
+    if count == 2:
+        return p_mom * p_dad
+    elif count == 1:
+        return p_mom * (1 - p_dad) + p_dad * (1 - p_mom)
+    return (1 - p_mom) * (1 - p_dad)
+
+
+def min_fill_order(factors):
+    """
+    Return an elimination ordering of every variable in `factors`,
+    greedily choosing the variable whose elimination adds the fewest
+    edges between its remaining neighbors.
+    """
+    neighbors = dict()
+    for variables, _ in factors:
+        for var in variables:
+            neighbors.setdefault(var, set()).update(
+                v for v in variables if v != var
+            )
+
+    def fill(var):
+        around = list(neighbors[var])
+        return sum(
+            1 for a, b in itertools.combinations(around, 2)
+            if b not in neighbors[a]
+        )
+
+    # Only the fill of an eliminated variable's neighbors can change
+    scores = {var: fill(var) for var in neighbors}
+    order = []
+    while scores:
+        var = min(scores, key=lambda v: (scores[v], len(neighbors[v])))
+        order.append(var)
+        del scores[var]
+        around = neighbors.pop(var)
+        for a in around:
+            neighbors[a].discard(var)
+            neighbors[a].update(around - {a})
+        changed = set(around)
+        for a in around:
+            changed.update(neighbors[a])
+        for a in changed:
+            scores[a] = fill(a)
+    return order
+
+
+def multiply(variables, factors, table=None):
+    """
+    Return a table over `variables` holding the product of `factors`,
+    and of `table` if given, which must already be over `variables`.
+    """
+    positions = [
+        [variables.index(v) for v in factor_variables]
+        for factor_variables, _ in factors
+    ]
+    product = dict()
+    for counts in itertools.product(GENES, repeat=len(variables)):
+        p = 1 if table is None else table[counts]
+        for (_, factor_table), pos in zip(factors, positions):
+            p *= factor_table[tuple(counts[k] for k in pos)]
+        product[counts] = p
+    return product
+
+
+def marginalize(variables, table, keep):
+    """
+    Return a factor over `keep` summing `table` over every other variable.
+    The result is rescaled to sum to 1 to avoid underflow on large families.
+    """
+    positions = [variables.index(v) for v in keep]
+    result = dict()
+    for counts, p in table.items():
+        key = tuple(counts[k] for k in positions)
+        result[key] = result.get(key, 0) + p
+    total = sum(result.values())
+    if total > 0:
+        result = {key: p / total for key, p in result.items()}
+    return (tuple(keep), result)
 
 
 def load_data(filename):
@@ -219,5 +805,17 @@ def normalize(probabilities):
             for status in trait_dict:
                 trait_dict[status] /= trait_sum
 
+METHODS = {
+    "enumerate": enumerate_probabilities,
+    "vectorize": vectorize_probabilities,
+    "eliminate": eliminate_probabilities
+}
+
+SAMPLERS = {
+    "likelihood": likelihood_weighting,
+    "gibbs": gibbs_sampling
+}
+
+
 if __name__ == "__main__":
     main()
@@ -1,10 +1,30 @@
+import heapq
+import json
+import math
 import os
 import random
 import re
 import sys
+import time
+
+from collections import deque
 
 DAMPING = 0.85
 SAMPLES = 10000
+TOLERANCE = 1e-6
+
+# Iterative solvers available to `solve_pagerank`
+SOLVERS = ["jacobi", "gauss-seidel", "aitken", "quadratic"]
+
+# Number of iterations between extrapolations
+EXTRAPOLATION_PERIOD = 10
+
+# Fraction of the link matrix's entries that incremental updates may
+# hold as a separate correction before it is merged into the matrix
+CORRECTION_FRACTION = 0.25
+
+# Links to other pages within an HTML file
+LINK = re.compile(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
 
 
 def main():
@@ -35,7 +55,7 @@ def crawl(directory):
             continue
         with open(os.path.join(directory, filename)) as f:
             contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
+            links = LINK.findall(contents)
             pages[filename] = set(links) - {filename}
 
     # Only include links to other pages in the corpus
@@ -48,6 +68,87 @@ def crawl(directory):
     return pages
 
 
+def crawl_edges(directory, cache=None, workers=None):
+    """
+    Parse a directory of HTML pages like `crawl`, but return the sorted
+    list of pages and an array with one (source, target) row of page
+    indices per link.
+
+    Files are read in chunks and parsed by a pool of `workers` processes.
+    If `cache` names a file, the links found in each page are saved there,
+    and pages whose modification time has not changed are not parsed again.
+    """
+    import numpy as np
+
+    pages = sorted(
+        filename for filename in os.listdir(directory)
+        if filename.endswith(".html")
+    )
+
+    # Reuse links of unchanged pages from the cache
+    known = dict()
+    if cache is not None and os.path.exists(cache):
+        with open(cache) as f:
+            known = json.load(f)
+    links = dict()
+    stale = []
+    for filename in pages:
+        mtime = os.stat(os.path.join(directory, filename)).st_mtime_ns
+        entry = known.get(filename)
+        if entry is not None and entry["mtime"] == mtime:
+            links[filename] = entry["links"]
+        else:
+            stale.append((filename, mtime))
+
+    # Parse changed pages in parallel
+    paths = [os.path.join(directory, filename) for filename, _ in stale]
+    if workers == 1 or len(paths) < 2:
+        parsed = list(map(parse_links, paths))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(workers) as executor:
+            parsed = list(executor.map(parse_links, paths, chunksize=64))
+    for (filename, mtime), found in zip(stale, parsed):
+        links[filename] = sorted(found)
+        known[filename] = {"mtime": mtime, "links": links[filename]}
+
+    # Save the cache if any page was added, changed or removed
+    if cache is not None and (stale or len(known) != len(pages)):
+        with open(cache, "w") as f:
+            json.dump({page: known[page] for page in pages}, f)
+
+    # Only include links to other pages in the corpus
+    index = {page: i for i, page in enumerate(pages)}
+    edges = np.fromiter(
+        (i for page in pages for link in links[page]
+         if link in index and link != page
+         for i in (index[page], index[link])),
+        dtype=np.int64
+    ).reshape(-1, 2)
+    return pages, edges
+
+
+def parse_links(path, chunk_size=1 << 16):
+    """
+    Return the set of links in an HTML file, reading `chunk_size`
+    characters at a time.
+    """
+    links = set()
+    tail = ""
+    with open(path) as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            text = tail + chunk
+            links.update(LINK.findall(text))
+
+            # Carry over a tag that may be cut off by the end of the chunk
+            start = text.rfind("<")
+            tail = text[start:] if start != -1 and ">" not in text[start:] else ""
+    return links
+
+
 def transition_model(corpus, page, damping_factor):
     """
     Return a probability distribution over which page to visit next,
@@ -98,10 +199,10 @@ def sample_pagerank(corpus, damping_factor, n):
 
 
 
-def iterate_pagerank(corpus, damping_factor):
+def iterate_pagerank(corpus, damping_factor, tolerance=0.001):
     """
     Return PageRank values for each page by iteratively updating
-    PageRank values until convergence.
+    PageRank values until no value changes by `tolerance` or more.
 
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
@@ -125,11 +226,632 @@ def iterate_pagerank(corpus, damping_factor):
             new_ranks[page] = total
 
         differences = [abs(new_ranks[p] - ranks[p]) for p in corpus]
-        if max(differences) < 0.001:
+        if max(differences) < tolerance:
             break
         ranks = new_ranks.copy()
     return ranks
 
 
+def save_edges(pages, edges, directory):
+    """
+    Save a link graph, as returned by `crawl_edges`, to `directory` for
+    `disk_pagerank`: the page names, each page's number of links, and the
+    link sources and targets as binary arrays sorted by target.
+    """
+    import numpy as np
+
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "pages.txt"), "w") as f:
+        for page in pages:
+            f.write(page + "\n")
+    order = np.argsort(edges[:, 1], kind="stable")
+    np.save(os.path.join(directory, "sources.npy"), edges[order, 0])
+    np.save(os.path.join(directory, "targets.npy"), edges[order, 1])
+    np.save(
+        os.path.join(directory, "degrees.npy"),
+        np.bincount(edges[:, 0], minlength=len(pages))
+    )
+
+
+def disk_pagerank(directory, damping_factor, tolerance=TOLERANCE,
+                  block_size=1 << 20, workers=None):
+    """
+    Return PageRank values for each page of a link graph saved by
+    `save_edges`, by power iteration that streams over the memory-mapped
+    links `block_size` at a time, so only rank arrays are kept in memory.
+
+    Blocks are processed in parallel by `workers` threads. Since links
+    are sorted by target, each block only adds to a narrow range of pages.
+    """
+    import numpy as np
+    from concurrent.futures import ThreadPoolExecutor
+
+    sources = np.load(os.path.join(directory, "sources.npy"), mmap_mode="r")
+    targets = np.load(os.path.join(directory, "targets.npy"), mmap_mode="r")
+    degrees = np.load(os.path.join(directory, "degrees.npy"), mmap_mode="r")
+    n = len(degrees)
+    dangling = degrees == 0
+    shares = np.where(dangling, 0, 1 / np.maximum(degrees, 1))
+
+    def spread(start, ranks):
+        block_sources = sources[start:start + block_size]
+        block_targets = targets[start:start + block_size]
+        first = block_targets[0]
+        return first, np.bincount(
+            block_targets - first,
+            weights=ranks[block_sources] * shares[block_sources]
+        )
+
+    ranks = np.full(n, 1 / n)
+    starts = range(0, len(sources), block_size)
+    with ThreadPoolExecutor(workers) as executor:
+        while True:
+            followed = np.zeros(n)
+            for first, block in executor.map(
+                spread, starts, [ranks] * len(starts)
+            ):
+                followed[first:first + len(block)] += block
+            leaked = ranks[dangling].sum()
+            new_ranks = (1 - damping_factor) / n + damping_factor * (
+                followed + leaked / n
+            )
+            change = np.abs(new_ranks - ranks).sum()
+            ranks = new_ranks
+            if change < tolerance:
+                break
+
+    with open(os.path.join(directory, "pages.txt")) as f:
+        pages = f.read().splitlines()
+    return dict(zip(pages, ranks.tolist()))
+
+
+def walk_pagerank(corpus, damping_factor, n, walkers=1000, processes=1,
+                  seed=None):
+    """
+    Return PageRank values for each page by sampling about `n` pages with
+    many random surfers at once, each taking O(1) work per step.
+
+    Each surfer starts on a random page and walks until the chance that it
+    has never followed a random jump is below TOLERANCE before its visits
+    are counted. Fewer than `walkers` surfers are used if they would
+    otherwise spend more steps on this than on counting.
+
+    The surfers are split evenly between `processes` worker processes.
+    """
+    import numpy as np
+
+    pages, offsets, targets = out_links(corpus)
+    burn_in = 0
+    if 0 < damping_factor < 1:
+        burn_in = math.ceil(math.log(TOLERANCE) / math.log(damping_factor))
+    walkers = max(1, min(walkers, n // max(burn_in, 1)))
+    steps = -(-n // walkers)
+    shares = [walkers // processes + (k < walkers % processes)
+              for k in range(processes)]
+    seeds = np.random.SeedSequence(seed).spawn(processes)
+    jobs = [
+        (offsets, targets, share, steps, burn_in, damping_factor, child)
+        for share, child in zip(shares, seeds) if share > 0
+    ]
+    if processes == 1:
+        counts = [walk(*job) for job in jobs]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(processes) as executor:
+            counts = list(executor.map(walk, *zip(*jobs)))
+    counts = sum(counts)
+    return dict(zip(pages, (counts / counts.sum()).tolist()))
+
+
+def walk(offsets, targets, walkers, steps, burn_in, damping_factor, seed):
+    """
+    Move `walkers` random surfers `burn_in + steps` times over the links
+    described by `offsets` and `targets`, and return how often each page
+    was visited during the last `steps`.
+
+    With probability `1 - damping_factor`, or if a page has no links, a
+    surfer jumps to a page chosen at random from the whole corpus.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    n = len(offsets) - 1
+    degree = np.diff(offsets)
+    counts = np.zeros(n, dtype=np.int64)
+    current = rng.integers(n, size=walkers)
+    for step in range(burn_in + steps):
+        if step >= burn_in:
+            counts += np.bincount(current, minlength=n)
+        links = degree[current]
+        follow = (rng.random(walkers) < damping_factor) & (links > 0)
+        choice = (rng.random(walkers) * links).astype(np.int64)
+        following = current[follow]
+        current = rng.integers(n, size=walkers)
+        current[follow] = targets[offsets[following] + choice[follow]]
+    return counts
+
+
+def out_links(corpus):
+    """
+    Return the pages of `corpus` in a fixed order, along with arrays
+    `offsets` and `targets` such that page i links to the pages
+    `targets[offsets[i]:offsets[i + 1]]`, by index.
+    """
+    import numpy as np
+
+    pages = list(corpus)
+    index = {page: i for i, page in enumerate(pages)}
+    offsets = np.zeros(len(pages) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(corpus[page]) for page in pages])
+    targets = np.fromiter(
+        (index[link] for page in pages for link in corpus[page]),
+        dtype=np.int64, count=offsets[-1]
+    )
+    return pages, offsets, targets
+
+
+def link_matrix(corpus):
+    """
+    Return the pages of `corpus` in a fixed order, along with a sparse CSR
+    matrix `M` where `M[j, i]` is the probability of following a link from
+    page i to page j, and a boolean array marking pages with no links.
+    """
+    import numpy as np
+
+    pages = list(corpus)
+    index = {page: i for i, page in enumerate(pages)}
+    edges = np.array(
+        [(index[page], index[link])
+         for page, links in corpus.items() for link in links],
+        dtype=np.int64
+    ).reshape(-1, 2)
+    matrix, dangling = edge_matrix(len(pages), edges)
+    return pages, matrix, dangling
+
+
+def edge_matrix(n, edges):
+    """
+    Return the link matrix and dangling page mask described in
+    `link_matrix`, for `n` pages linked by `edges`, an array with one
+    (source, target) row per link.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    sources = edges[:, 0]
+    targets = edges[:, 1]
+    out_degree = np.bincount(sources, minlength=n)
+    matrix = sparse.csr_matrix(
+        (1 / out_degree[sources], (targets, sources)), shape=(n, n)
+    )
+    return matrix, out_degree == 0
+
+
+def sparse_pagerank(corpus, damping_factor, tolerance=TOLERANCE):
+    """
+    Return PageRank values for each page by power iteration with a sparse
+    link matrix, until the ranks change by less than `tolerance` in total.
+
+    Pages with no links spread their rank evenly over every page; this is
+    applied as a single correction rather than stored in the matrix.
+    """
+    import numpy as np
+
+    pages, matrix, dangling = link_matrix(corpus)
+    ranks = np.full(len(pages), 1 / len(pages))
+    ranks, _ = power_iteration(
+        matrix, dangling, ranks, damping_factor, tolerance
+    )
+    return dict(zip(pages, ranks.tolist()))
+
+
+def power_iteration(matrix, dangling, ranks, damping_factor, tolerance,
+                    teleport=None):
+    """
+    Iterate PageRank from the array `ranks` over the link matrix and
+    dangling page mask returned by `link_matrix`, until the ranks change
+    by less than `tolerance` in total.
+
+    The surfer jumps to, and leaves dangling pages for, pages chosen
+    according to the array `teleport`, or to any page evenly if it is None.
+
+    Return the final ranks and the number of iterations taken.
+    """
+    import numpy as np
+
+    n = len(ranks)
+    if teleport is None:
+        teleport = 1 / n
+    iterations = 0
+    while True:
+        leaked = ranks[dangling].sum()
+        new_ranks = (1 - damping_factor) * teleport + damping_factor * (
+            matrix @ ranks + leaked * teleport
+        )
+        change = np.abs(new_ranks - ranks).sum()
+        ranks = new_ranks
+        iterations += 1
+        if change < tolerance:
+            return ranks, iterations
+
+
+def solve_pagerank(corpus, damping_factor, method="jacobi",
+                   tolerance=TOLERANCE, max_iterations=1000):
+    """
+    Return PageRank values for each page using one of the `SOLVERS`, along
+    with statistics about the solve: the number of "iterations", and the
+    L1 "residuals" (change in ranks) and "times" in seconds of each one.
+
+    * "jacobi" is plain power iteration, as in `sparse_pagerank`.
+    * "gauss-seidel" updates pages one by one, using the new ranks of
+      earlier pages as soon as they are known.
+    * "aitken" is power iteration with Aitken extrapolation of each rank
+      from the last three iterates, every `EXTRAPOLATION_PERIOD` iterations.
+    * "quadratic" is the same with quadratic extrapolation from the last
+      four iterates.
+
+    An extrapolation is kept only if one more step from it changes the
+    ranks less than the last step did. That extra step is timed as part of the
+    iteration that tried it.
+    """
+    import numpy as np
+
+    if method not in SOLVERS:
+        raise ValueError(f"Unknown solver: {method}")
+    pages, matrix, dangling = link_matrix(corpus)
+    n = len(pages)
+    if method == "gauss-seidel":
+        step = gauss_seidel(matrix, dangling, damping_factor)
+    else:
+        def step(ranks):
+            leaked = ranks[dangling].sum()
+            return (1 - damping_factor) / n + damping_factor * (
+                matrix @ ranks + leaked / n
+            )
+
+    ranks = np.full(n, 1 / n)
+    history = []
+    stats = {"iterations": 0, "residuals": [], "times": []}
+    while stats["iterations"] < max_iterations:
+        start = time.perf_counter()
+        new_ranks = step(ranks)
+        stats["iterations"] += 1
+        if method in ["aitken", "quadratic"]:
+            extrapolate = aitken if method == "aitken" else quadratic
+            size = 3 if method == "aitken" else 4
+            history = (history + [new_ranks])[-size:]
+            due = stats["iterations"] % EXTRAPOLATION_PERIOD == 0
+            if len(history) == size and due:
+
+                # Keep the extrapolation only if it is closer to converging
+                guess = extrapolate(*history)
+                guess_step = step(guess)
+                if (np.abs(guess_step - guess).sum()
+                        < np.abs(new_ranks - ranks).sum()):
+                    new_ranks = guess_step
+                history = []
+        residual = np.abs(new_ranks - ranks).sum()
+        ranks = new_ranks
+        stats["residuals"].append(float(residual))
+        stats["times"].append(time.perf_counter() - start)
+        if residual < tolerance:
+            break
+    return dict(zip(pages, ranks.tolist())), stats
+
+
+def gauss_seidel(matrix, dangling, damping_factor):
+    """
+    Return a function performing one Gauss-Seidel sweep of PageRank over
+    the link matrix and dangling page mask returned by `link_matrix`.
+    """
+    offsets = matrix.indptr.tolist()
+    sources = matrix.indices.tolist()
+    weights = matrix.data.tolist()
+    is_dangling = dangling.tolist()
+
+    def sweep(ranks):
+        import numpy as np
+
+        n = len(ranks)
+        ranks = ranks.tolist()
+        leaked = sum(r for r, d in zip(ranks, is_dangling) if d)
+        for i in range(n):
+            total = 0
+            for k in range(offsets[i], offsets[i + 1]):
+                total += weights[k] * ranks[sources[k]]
+            new_rank = (1 - damping_factor) / n + damping_factor * (
+                total + leaked / n
+            )
+            if is_dangling[i]:
+                leaked += new_rank - ranks[i]
+            ranks[i] = new_rank
+
+        ranks = np.array(ranks)
+        return ranks / ranks.sum()
+
+    return sweep
+
+
+def aitken(first, second, third):
+    """
+    Return an Aitken extrapolation of the limit of three successive
+    rank arrays, falling back to the latest ranks where it is unstable.
+    """
+    import numpy as np
+
+    step = third - second
+    curvature = third - 2 * second + first
+    stable = np.abs(curvature) > 1e-15
+    ranks = third.copy()
+    ranks[stable] -= step[stable] ** 2 / curvature[stable]
+    ranks = np.where(ranks > 0, ranks, third)
+    return ranks / ranks.sum()
+
+
+def quadratic(first, second, third, fourth):
+    """
+    Return a quadratic extrapolation of the limit of four successive rank
+    arrays, assuming their error is dominated by two eigenvectors.
+    """
+    import numpy as np
+
+    differences = np.stack([second - first, third - first], axis=1)
+    (g1, g2), *_ = np.linalg.lstsq(
+        differences, first - fourth, rcond=None
+    )
+    ranks = (g1 + g2 + 1) * second + (g2 + 1) * third + fourth
+    ranks = np.where(ranks > 0, ranks, fourth)
+    return ranks / ranks.sum()
+
+
+class PersonalizedPageRank():
+    """
+    Approximate personalised PageRank over a corpus by forward push.
+
+    A surfer personalised to a seed page jumps back to the seed, instead
+    of to a random page, with probability `1 - damping_factor` and
+    whenever a page has no links. Estimates and residual probability are
+    kept per seed, so later queries for the same seed only push what is
+    left to reach a smaller tolerance.
+    """
+
+    def __init__(self, corpus, damping_factor=DAMPING):
+        self.links = {page: list(links) for page, links in corpus.items()}
+        self.damping_factor = damping_factor
+
+        # Map each seed to its rank estimates, residual probability,
+        # and the smallest tolerance pushed to so far
+        self.cache = dict()
+
+    def ranks(self, seed, tolerance=1e-4):
+        """
+        Return a dictionary of estimated personalised PageRank values for
+        `seed`, containing only pages that received some rank.
+
+        Pushing stops once every page's residual is at most `tolerance`
+        times its number of links (or `tolerance`, for a page with none).
+        """
+        return dict(self.push(seed, tolerance))
+
+    def push(self, seed, tolerance):
+        """
+        Push residual probability for `seed` down to `tolerance`, as
+        described in `ranks`, and return the cached rank estimates, which
+        later pushes keep updating.
+        """
+        if seed not in self.cache:
+            self.cache[seed] = {
+                "ranks": dict(),
+                "residuals": {seed: 1.0},
+                "tolerance": float("inf")
+            }
+        cached = self.cache[seed]
+        ranks = cached["ranks"]
+        residuals = cached["residuals"]
+        if tolerance >= cached["tolerance"]:
+            return ranks
+
+        def active(page):
+            return residuals[page] > tolerance * max(len(self.links[page]), 1)
+
+        queue = deque(page for page in residuals if active(page))
+        queued = set(queue)
+        while queue:
+            page = queue.popleft()
+            queued.discard(page)
+            residual = residuals.pop(page)
+
+            # Keep part of the residual, and spread the rest along links
+            ranks[page] = ranks.get(page, 0) + (1 - self.damping_factor) * residual
+            targets = self.links[page] or [seed]
+            share = self.damping_factor * residual / len(targets)
+            for target in targets:
+                residuals[target] = residuals.get(target, 0) + share
+                if target not in queued and active(target):
+                    queue.append(target)
+                    queued.add(target)
+        cached["tolerance"] = tolerance
+        return ranks
+
+    def top(self, seed, k=10, tolerance=1e-4):
+        """
+        Return a list of the `k` pages most relevant to `seed`, as
+        (page, rank) pairs from highest to lowest estimated rank.
+        """
+        ranks = self.push(seed, tolerance)
+        return heapq.nlargest(k, ranks.items(), key=lambda item: item[1])
+
+
+class IncrementalPageRank():
+    """
+    PageRank over a corpus that changes by a few links at a time.
+
+    Each page keeps its index in the link matrix while it exists. An
+    update only touches the links it names: it replaces the columns of
+    pages whose links changed in a sparse correction to the matrix, and
+    power iteration restarts from the previous ranks. Once the correction
+    holds more than CORRECTION_FRACTION of the matrix's entries, it is
+    merged into the matrix and the slots of removed pages are dropped.
+    """
+
+    def __init__(self, corpus, damping_factor=DAMPING, tolerance=TOLERANCE):
+        import numpy as np
+        from scipy import sparse
+
+        self.damping_factor = damping_factor
+        self.tolerance = tolerance
+
+        # Out-links and in-links of every page, kept up to date by `update`
+        self.links = {page: set(links) for page, links in corpus.items()}
+        self.linked_from = {page: set() for page in corpus}
+        for page, links in self.links.items():
+            for link in links:
+                self.linked_from[link].add(page)
+
+        self.pages, self.matrix, _ = link_matrix(corpus)
+        self.index = {page: i for i, page in enumerate(self.pages)}
+        self.degree = np.array([len(self.links[page]) for page in self.pages])
+        self.present = np.ones(len(self.pages), dtype=bool)
+        self.correction = sparse.csr_matrix(self.matrix.shape)
+        self.values = np.full(len(self.pages), 1 / len(self.pages))
+        self.iterations = self.solve()
+
+    def update(self, added=(), removed=(), linked=(), unlinked=()):
+        """
+        Add the pages `added`, add the links `linked` and remove the links
+        `unlinked`, both given as (page, link) pairs, then remove the pages
+        `removed` with every link to and from them. Links that involve a
+        page not in the corpus, or that point a page at itself, are ignored.
+
+        Return the number of iterations taken to update the ranks.
+        """
+        import numpy as np
+        from scipy import sparse
+
+        # Give new pages the next free slots
+        new = [page for page in dict.fromkeys(added) if page not in self.links]
+        for page in new:
+            self.index[page] = len(self.pages)
+            self.pages.append(page)
+            self.links[page] = set()
+            self.linked_from[page] = set()
+        if new:
+            size = len(self.pages)
+            self.matrix.resize((size, size))
+            self.correction.resize((size, size))
+            self.degree = np.concatenate([self.degree, np.zeros(len(new), int)])
+            self.present = np.concatenate([self.present, np.ones(len(new), bool)])
+            self.values = np.concatenate([
+                self.values, np.full(len(new), 1 / self.present.sum())
+            ])
+
+        # Change links, remembering the old links of each page changed
+        before = dict()
+
+        def change(page, link, add):
+            if page not in self.links or link not in self.links or page == link:
+                return
+            before.setdefault(page, set(self.links[page]))
+            if add:
+                self.links[page].add(link)
+                self.linked_from[link].add(page)
+            else:
+                self.links[page].discard(link)
+                self.linked_from[link].discard(page)
+
+        for page, link in linked:
+            change(page, link, True)
+        for page, link in unlinked:
+            change(page, link, False)
+        gone = [page for page in dict.fromkeys(removed) if page in self.links]
+        for page in gone:
+            for source in list(self.linked_from[page]):
+                change(source, page, False)
+            for link in list(self.links[page]):
+                change(page, link, False)
+
+        # Swap the old column of each changed page for its new one
+        rows, columns, weights = [], [], []
+        for page, old in before.items():
+            links = self.links[page]
+            if links == old:
+                continue
+            i = self.index[page]
+            for link in old:
+                rows.append(self.index[link])
+                columns.append(i)
+                weights.append(-1 / len(old))
+            for link in links:
+                rows.append(self.index[link])
+                columns.append(i)
+                weights.append(1 / len(links))
+            self.degree[i] = len(links)
+        if rows:
+            self.correction = self.correction + sparse.csr_matrix(
+                (weights, (rows, columns)), shape=self.matrix.shape
+            )
+
+        # Empty the slots of removed pages
+        for page in gone:
+            i = self.index.pop(page)
+            del self.links[page]
+            del self.linked_from[page]
+            self.pages[i] = None
+            self.present[i] = False
+            self.values[i] = 0
+        if self.correction.nnz > CORRECTION_FRACTION * self.matrix.nnz:
+            self.merge()
+
+        self.values /= self.values.sum()
+        self.iterations = self.solve()
+        return self.iterations
+
+    def merge(self):
+        """
+        Add the correction into the link matrix, and drop the slots of
+        removed pages.
+        """
+        import numpy as np
+        from scipy import sparse
+
+        keep = np.flatnonzero(self.present)
+        matrix = self.matrix + self.correction
+        self.matrix = matrix[keep][:, keep]
+        self.matrix.eliminate_zeros()
+        self.correction = sparse.csr_matrix(self.matrix.shape)
+        self.pages = [self.pages[i] for i in keep]
+        self.index = {page: i for i, page in enumerate(self.pages)}
+        self.degree = self.degree[keep]
+        self.present = self.present[keep]
+        self.values = self.values[keep]
+
+    def solve(self):
+        """
+        Iterate the ranks of present pages to convergence, starting from
+        their current values, and return the number of iterations taken.
+        """
+        from scipy.sparse.linalg import aslinearoperator
+
+        matrix = self.matrix
+        if self.correction.nnz:
+            matrix = aslinearoperator(matrix) + aslinearoperator(self.correction)
+        teleport = self.present / self.present.sum()
+        self.values, iterations = power_iteration(
+            matrix, self.present & (self.degree == 0), self.values,
+            self.damping_factor, self.tolerance, teleport
+        )
+        return iterations
+
+    def ranks(self):
+        """
+        Return a dictionary of the current PageRank value of every page.
+        """
+        return {
+            page: rank
+            for page, rank in zip(self.pages, self.values.tolist())
+            if page is not None
+        }
+
+
 if __name__ == "__main__":
     main()